@@ -0,0 +1,248 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, Security
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
+
+from .metrics import stage
+
+# certificates Firebase signs ID tokens with, keyed by key id
+FIREBASE_CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+
+class InvalidTokenError(Exception):
+    pass
+
+
+class PublicKeyCache:
+    """Firebase's public signing certificates, refetched when their Cache-Control max-age runs out.
+
+    A token signed with an unknown key id triggers an early refresh, at most once per
+    ``min_refresh_interval`` seconds, so key rotation is picked up without a restart.
+    """
+
+    def __init__(self, url: str = FIREBASE_CERTS_URL, min_refresh_interval: float = 60.0,
+                 default_max_age: float = 3600.0):
+        self.url = url
+        self.min_refresh_interval = min_refresh_interval
+        self.default_max_age = default_max_age
+        self._keys: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def fetch(self) -> Tuple[Dict[str, str], float]:
+        """Return the keys and how many seconds they may be cached"""
+        response = httpx.get(self.url, timeout=10)
+        response.raise_for_status()
+        match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+        return response.json(), float(match.group(1)) if match else self.default_max_age
+
+    def get(self, kid: Optional[str] = None) -> Mapping[str, str]:
+        now = time.time()
+        stale = now >= self._expires_at
+        unknown_kid = kid is not None and kid not in self._keys and now - self._fetched_at >= self.min_refresh_interval
+        if stale or unknown_kid:
+            with self._lock:
+                # another thread may have refreshed while we waited for the lock
+                if time.time() >= self._expires_at or (unknown_kid and kid not in self._keys):
+                    keys, max_age = self.fetch()
+                    self._keys, self._fetched_at = keys, time.time()
+                    self._expires_at = self._fetched_at + max_age
+        return self._keys
+
+
+class StaticKeys:
+    """A fixed set of public keys or certificates, for verifying tokens signed by a local key pair"""
+
+    def __init__(self, keys: Mapping[str, str]):
+        self._keys = dict(keys)
+
+    def get(self, kid: Optional[str] = None) -> Mapping[str, str]:
+        return self._keys
+
+
+_firebase_lock = threading.Lock()
+
+
+def firebase_app():
+    """The default Firebase app, initialized with the application default credentials on first use"""
+    import firebase_admin
+    from firebase_admin import credentials
+
+    with _firebase_lock:
+        try:
+            return firebase_admin.get_app()
+        except ValueError:
+            return firebase_admin.initialize_app(credentials.ApplicationDefault())
+
+
+def firebase_revocation_lookup(uid: str) -> Tuple[float, bool]:
+    """Return the time (in seconds) before which the user's tokens are revoked, and whether the user is disabled"""
+    from firebase_admin import auth
+
+    user = auth.get_user(uid, app=firebase_app())
+    return (user.tokens_valid_after_timestamp or 0) / 1000, user.disabled
+
+
+@dataclass
+class _Verified:
+    claims: dict
+    expires_at: float
+
+
+class TokenVerifier:
+    """Verifies Firebase ID tokens locally and caches the result until the token expires.
+
+    Verification checks the RS256 signature against ``keys`` and the claims Firebase documents
+    (aud, iss, sub, iat, exp, auth_time). Revocation is only checked when ``check_revoked`` is set,
+    and a user's revocation state is looked up at most every ``revocation_ttl`` seconds.
+    """
+
+    def __init__(self, project_id: Optional[str] = None, keys=None, max_entries: int = 10000,
+                 clock_skew: int = 0, check_revoked: bool = False, revocation_ttl: float = 300.0,
+                 revocation_lookup: Callable[[str], Tuple[float, bool]] = firebase_revocation_lookup):
+        self._project_id = project_id
+        self.keys = keys if keys is not None else PublicKeyCache()
+        self.max_entries = max_entries
+        self.clock_skew = clock_skew
+        self.check_revoked = check_revoked
+        self.revocation_ttl = revocation_ttl
+        self.revocation_lookup = revocation_lookup
+        self._verified: "OrderedDict[str, _Verified]" = OrderedDict()
+        self._revocations: Dict[str, Tuple[float, bool, float]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "TokenVerifier":
+        return cls(
+            project_id=os.environ.get("FIREBASE_PROJECT_ID") or None,
+            max_entries=int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", "10000")),
+            clock_skew=int(os.environ.get("AUTH_CLOCK_SKEW", "0")),
+            check_revoked=os.environ.get("AUTH_CHECK_REVOKED", "false").lower() == "true",
+            revocation_ttl=float(os.environ.get("AUTH_REVOCATION_TTL", "300")),
+        )
+
+    @property
+    def project_id(self) -> str:
+        if self._project_id is None:
+            self._project_id = firebase_app().project_id
+            if not self._project_id:
+                raise InvalidTokenError("Set FIREBASE_PROJECT_ID to verify ID tokens")
+        return self._project_id
+
+    def cached(self, token: str) -> Optional[dict]:
+        """Claims of an already verified, unexpired token, without any cryptography"""
+        key = hashlib.sha256(token.encode()).hexdigest()
+        with self._lock:
+            entry = self._verified.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.time() >= entry.expires_at + self.clock_skew:
+                del self._verified[key]
+                self.misses += 1
+                return None
+            self._verified.move_to_end(key)
+            self.hits += 1
+            return entry.claims
+
+    def verify_signature(self, token: str) -> dict:
+        """Fully verify a token and cache its claims until it expires"""
+        try:
+            header = google_jwt.decode_header(token)
+            if header.get("alg") != "RS256":
+                raise InvalidTokenError(f"ID token has incorrect algorithm {header.get('alg')!r}")
+            claims = google_jwt.decode(
+                token,
+                certs=self.keys.get(header.get("kid")),
+                audience=self.project_id,
+                clock_skew_in_seconds=self.clock_skew,
+            )
+        except (ValueError, google_exceptions.GoogleAuthError) as e:
+            raise InvalidTokenError(f"Invalid ID token: {e}") from e
+
+        if claims.get("iss") != f"https://securetoken.google.com/{self.project_id}":
+            raise InvalidTokenError("ID token has incorrect issuer")
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise InvalidTokenError("ID token has an invalid subject")
+        if claims.get("auth_time", 0) > time.time() + self.clock_skew:
+            raise InvalidTokenError("ID token has an auth_time in the future")
+        claims["uid"] = subject
+
+        if self.max_entries > 0:
+            key = hashlib.sha256(token.encode()).hexdigest()
+            with self._lock:
+                self._verified[key] = _Verified(claims, float(claims["exp"]))
+                self._verified.move_to_end(key)
+                while len(self._verified) > self.max_entries:
+                    self._verified.popitem(last=False)
+        return claims
+
+    def _revocation_state(self, uid: str) -> Tuple[float, bool]:
+        state = self._revocations.get(uid)
+        if state is None or time.time() - state[2] > self.revocation_ttl:
+            valid_after, disabled = self.revocation_lookup(uid)
+            state = (valid_after, disabled, time.time())
+            self._revocations[uid] = state
+        return state[0], state[1]
+
+    def check_revocation(self, claims: dict) -> None:
+        valid_after, disabled = self._revocation_state(claims["uid"])
+        if disabled:
+            raise InvalidTokenError("The user account is disabled")
+        if claims.get("auth_time", 0) < valid_after:
+            raise InvalidTokenError("The ID token has been revoked")
+
+    def verify(self, token: str) -> dict:
+        claims = self.cached(token) or self.verify_signature(token)
+        if self.check_revoked:
+            self.check_revocation(claims)
+        return claims
+
+    async def averify(self, token: str) -> dict:
+        """Like verify, but any cryptography or network call runs in a worker thread"""
+        claims = self.cached(token)
+        if claims is None:
+            claims = await run_in_threadpool(self.verify_signature, token)
+        if self.check_revoked:
+            await run_in_threadpool(self.check_revocation, claims)
+        return claims
+
+    def warm(self) -> None:
+        """Fetch the signing keys and resolve the project id now, so the first request does not wait for them"""
+        self.keys.get()
+        self.project_id
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "cached_tokens": len(self._verified)}
+
+
+# protect the api by verifying the Authorizer header with Firebase,
+# the Firebase app is only initialized when the project id or a revocation check needs it
+security = HTTPBearer()
+token_verifier = TokenVerifier.from_env()
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
+    token = credentials.credentials
+    try:
+        # Verify the Firebase token, signatures are only checked the first time a token is seen
+        with stage("auth"):
+            decoded_token = await token_verifier.averify(token)
+        return decoded_token
+    except Exception as e:
+        print(e)
+        raise HTTPException(status_code=403, detail=f"Invalid authentication credentials: {str(e)}")
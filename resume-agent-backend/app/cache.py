@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Normalize resume text so trivial differences (ligatures, spacing) hit the same cache entry"""
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_key(text: str, model: str, schema_version: str, variant: str = "") -> str:
+    """Content-address a parse by normalized text, model name, schema version and extraction variant"""
+    digest = hashlib.sha256()
+    parts = (schema_version, model, variant, normalize_text(text)) if variant else (schema_version, model, normalize_text(text))
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    # rows deleted from the SQLite tier because they expired or were over disk_max_entries
+    disk_purged: int = 0
+    # seconds of LLM latency that cache hits avoided, measured when the entry was produced
+    saved_seconds: float = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_purged": self.disk_purged,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "saved_llm_calls": hits,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+@dataclass
+class _Entry:
+    value: Any
+    elapsed: float
+    created: float
+
+
+@dataclass
+class ParseCache:
+    """Two tier cache for parsed resumes: an in-memory LRU and an optional SQLite file.
+
+    Entries expire after ``ttl`` seconds in memory and ``disk_ttl`` seconds on disk (0 disables expiry).
+    Keys are content hashes that are rarely looked up again once expired, so at most every
+    ``disk_purge_interval`` seconds a write also deletes the expired rows and, when ``disk_max_entries``
+    is set, the oldest rows beyond it.
+    """
+    max_entries: int = 512
+    ttl: float = 3600.0
+    disk_path: Optional[str] = None
+    disk_ttl: float = 7 * 24 * 3600.0
+    disk_max_entries: int = 0
+    disk_purge_interval: float = 300.0
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    def __post_init__(self):
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if self.disk_path:
+            self._db = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, elapsed REAL NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS parse_cache_created ON parse_cache (created)")
+            self._db.commit()
+        self._last_purge = 0.0
+        if self._db is not None:
+            with self._lock:
+                self._purge(time.time())
+
+    @classmethod
+    def from_env(cls) -> "ParseCache":
+        return cls(
+            max_entries=int(os.environ.get("PARSE_CACHE_SIZE", "512")),
+            ttl=float(os.environ.get("PARSE_CACHE_TTL", "3600")),
+            disk_path=os.environ.get("PARSE_CACHE_PATH") or None,
+            disk_ttl=float(os.environ.get("PARSE_CACHE_DISK_TTL", str(7 * 24 * 3600))),
+            disk_max_entries=int(os.environ.get("PARSE_CACHE_DISK_SIZE", "0")),
+            disk_purge_interval=float(os.environ.get("PARSE_CACHE_PURGE_INTERVAL", "300")),
+        )
+
+    def _expired(self, created: float, ttl: float, now: float) -> bool:
+        return ttl > 0 and now - created > ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry.created, self.ttl, now):
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    self.stats.saved_seconds += entry.elapsed
+                    return entry.value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, elapsed, created FROM parse_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, elapsed, created = row
+                    if not self._expired(created, self.disk_ttl, now):
+                        value = json.loads(value)
+                        # promote to memory, the in-memory TTL restarts from now
+                        self._put_memory(key, _Entry(value, elapsed, now))
+                        self.stats.disk_hits += 1
+                        self.stats.saved_seconds += elapsed
+                        return value
+                    self._db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats.misses += 1
+            return None
+
+    def set(self, key: str, value: Any, elapsed: float = 0.0) -> None:
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, _Entry(value, elapsed, now))
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, value, elapsed, created) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), elapsed, now),
+                )
+                self._db.commit()
+                if now - self._last_purge >= self.disk_purge_interval:
+                    self._purge(now)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        # the SQLite tier does blocking file I/O, keep it off the event loop
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, elapsed: float = 0.0) -> None:
+        if self._db is None:
+            return self.set(key, value, elapsed)
+        await asyncio.to_thread(self.set, key, value, elapsed)
+
+    def _purge(self, now: float) -> None:
+        """Delete expired rows, then the oldest rows over disk_max_entries. Called with the lock held."""
+        purged = 0
+        if self.disk_ttl > 0:
+            purged += self._db.execute("DELETE FROM parse_cache WHERE created < ?", (now - self.disk_ttl,)).rowcount
+        if self.disk_max_entries > 0:
+            purged += self._db.execute(
+                "DELETE FROM parse_cache WHERE key IN "
+                "(SELECT key FROM parse_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            ).rowcount
+        self._db.commit()
+        self.stats.disk_purged += purged
+        self._last_purge = now
+
+    def _put_memory(self, key: str, entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+                self._db.commit()
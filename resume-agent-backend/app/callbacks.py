@@ -0,0 +1,78 @@
+import time
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .metrics import ERRORS, STAGES_IN_FLIGHT, observe_stage, record_tokens
+from .preprocess import get_token_counter
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times the prompt, LLM and parser steps of the extraction chains and counts the LLM tokens they use.
+
+    The parser step consumes the LLM's output as it streams, so for streamed parses its time
+    overlaps with the LLM's.
+    """
+
+    # cheap enough to run on the event loop instead of a worker thread
+    run_inline = True
+    # chain steps timed as stages, by runnable name
+    STEP_STAGES = {"ChatPromptTemplate": "prompt", "JsonOutputFunctionsParser": "parse"}
+
+    def __init__(self):
+        self._runs: Dict[UUID, Tuple[str, float, Any]] = {}
+
+    def _start(self, run_id: UUID, stage_name: str, payload: Any = None) -> None:
+        STAGES_IN_FLIGHT.inc(stage=stage_name)
+        self._runs[run_id] = (stage_name, time.perf_counter(), payload)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return None
+        stage_name, started, payload = run
+        STAGES_IN_FLIGHT.dec(stage=stage_name)
+        observe_stage(stage_name, time.perf_counter() - started)
+        if error is not None:
+            ERRORS.inc(stage=stage_name, type=type(error).__name__)
+        return payload
+
+    def on_chain_start(self, serialized, inputs, *, run_id: UUID, **kwargs) -> None:
+        stage_name = self.STEP_STAGES.get(kwargs.get("name"))
+        if stage_name is not None:
+            self._start(run_id, stage_name)
+
+    def on_chain_end(self, outputs, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type") or "unknown"
+        prompt = "\n".join(str(message.content) for batch in messages for message in batch)
+        self._start(run_id, "llm", (model, prompt))
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        payload = self._end(run_id)
+        if payload is None:
+            return
+        model, prompt = payload
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            record_tokens(model, usage["prompt_tokens"], usage.get("completion_tokens") or 0)
+            return
+        # streamed responses and some providers report no usage, count the text ourselves
+        count = get_token_counter(model)
+        completion = ""
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                function_call = message.additional_kwargs.get("function_call") if message is not None else None
+                completion += function_call["arguments"] if function_call else generation.text
+        record_tokens(model, count(prompt), count(completion))
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._end(run_id, error)
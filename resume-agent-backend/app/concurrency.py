@@ -0,0 +1,143 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple, Union
+
+from .metrics import stage
+
+# set by the /jobs workers: their LLM calls are background work from a durable queue, so they wait
+# for a slot as long as it takes instead of being rejected or timing out like interactive requests
+background_var: ContextVar[bool] = ContextVar("background", default=False)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when an LLM call cannot get a slot, the server answers it with 429"""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BackendUnavailable(Exception):
+    """Raised when no model backend (app.model_router) could answer, the server answers it with 503.
+
+    ``attempted`` tells whether any backend was called and failed, rather than all being skipped
+    because their circuit breakers are open.
+    """
+
+    def __init__(self, message: str, retry_after: int = 5, attempted: bool = False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.attempted = attempted
+
+
+class LLMLimiter:
+    """Caps the number of concurrent LLM calls on this worker.
+
+    Up to ``max_concurrency`` calls run at once, up to ``max_queue`` more wait for a slot
+    (a negative value means an unbounded queue) for at most ``queue_timeout`` seconds.
+    Anything beyond that is rejected with ``ConcurrencyLimitExceeded``. Calls made with
+    ``background_var`` set wait without either limit and are not counted in the queue.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, queue_timeout: Optional[float] = 30.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.background_waiting = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMLimiter":
+        queue_timeout = float(os.environ.get("LLM_QUEUE_TIMEOUT", "30"))
+        return cls(
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.environ.get("LLM_MAX_QUEUE", "32")),
+            queue_timeout=queue_timeout if queue_timeout > 0 else None,
+        )
+
+    @asynccontextmanager
+    async def slot(self):
+        with stage("llm_queue"):
+            if background_var.get():
+                self.background_waiting += 1
+                try:
+                    await self._semaphore.acquire()
+                finally:
+                    self.background_waiting -= 1
+            else:
+                await self._acquire()
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _acquire(self) -> None:
+        if self._semaphore.locked() and 0 <= self.max_queue <= self.waiting:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded("Too many resumes are being parsed, try again shortly")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise ConcurrencyLimitExceeded("Timed out waiting for a free LLM slot, try again shortly")
+        finally:
+            self.waiting -= 1
+
+    def try_acquire(self) -> bool:
+        """Take a free slot without waiting, for optional calls such as hedges; pair it with release()"""
+        # a free slot goes to the callers already waiting for one first
+        if self._semaphore.locked() or self.waiting or self.background_waiting:
+            return False
+        self._semaphore._value -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "background_waiting": self.background_waiting,
+            "rejected": self.rejected,
+        }
+
+
+async def bounded_as_completed(
+    jobs: Sequence[Callable[[], Awaitable[Any]]], limit: int
+) -> AsyncIterator[Tuple[int, Union[Any, Exception]]]:
+    """Run ``jobs`` with at most ``limit`` in flight and yield ``(index, result)`` as each finishes.
+
+    A failing job yields its exception instead of a result so the rest keep going.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(index: int, job: Callable[[], Awaitable[Any]]):
+        async with semaphore:
+            try:
+                return index, await job()
+            except Exception as e:
+                return index, e
+
+    tasks = [asyncio.create_task(run(i, job)) for i, job in enumerate(jobs)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # the client went away mid-stream, don't keep paying for the remaining LLM calls
+        for task in tasks:
+            task.cancel()
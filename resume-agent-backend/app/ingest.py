@@ -0,0 +1,131 @@
+import asyncio
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, List, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from .metrics import stage
+
+
+class IngestError(Exception):
+    """An upload that cannot be parsed, the server answers it with ``status_code``"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class IngestSettings:
+    max_upload_bytes: int = 20 * 1024 * 1024
+    max_pages: int = 50
+    # documents with at least this many pages are extracted across the process pool
+    parallel_min_pages: int = 16
+    workers: int = max(1, min(4, os.cpu_count() or 1))
+    chunk_size: int = 1024 * 1024
+
+    @classmethod
+    def from_env(cls) -> "IngestSettings":
+        return cls(
+            max_upload_bytes=int(float(os.environ.get("INGEST_MAX_UPLOAD_MB", cls.max_upload_bytes / 1024 / 1024)) * 1024 * 1024),
+            max_pages=int(os.environ.get("INGEST_MAX_PAGES", cls.max_pages)),
+            parallel_min_pages=int(os.environ.get("INGEST_PARALLEL_MIN_PAGES", cls.parallel_min_pages)),
+            workers=int(os.environ.get("INGEST_WORKERS", cls.workers)),
+        )
+
+
+settings = IngestSettings.from_env()
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn rather than fork, forking a process that runs an event loop and threads is unsafe
+        _process_pool = ProcessPoolExecutor(settings.workers, mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+
+def spool_to_file(source: BinaryIO, max_bytes: int, chunk_size: int = 1024 * 1024) -> str:
+    """Copy an upload to a temp file chunk by chunk, refusing it as soon as it exceeds ``max_bytes``"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    written = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := source.read(chunk_size):
+                written += len(chunk)
+                if written > max_bytes:
+                    raise IngestError(f"The file is larger than {max_bytes // 1024 // 1024} MB", status_code=413)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+@asynccontextmanager
+async def spooled_upload(file: UploadFile) -> AsyncIterator[str]:
+    """Spool an upload to a temp file for the duration of the block and yield its path"""
+    if file.size is not None and file.size > settings.max_upload_bytes:
+        raise IngestError(f"The file is larger than {settings.max_upload_bytes // 1024 // 1024} MB", status_code=413)
+    with stage("upload"):
+        await file.seek(0)
+        path = await run_in_threadpool(spool_to_file, file.file, settings.max_upload_bytes, settings.chunk_size)
+    try:
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def count_pages(path: str, max_pages: int) -> int:
+    """Open the PDF just far enough to validate it and check the page limit, before any text extraction"""
+    # imported on the first upload (and in each pool worker) rather than at server start
+    import pymupdf
+
+    try:
+        # opening by path lets MuPDF read the file lazily instead of loading it into memory
+        with pymupdf.open(path, filetype="pdf") as pdf:
+            if pdf.needs_pass:
+                raise IngestError("The PDF is password protected")
+            page_count = pdf.page_count
+    except RuntimeError as e:
+        raise IngestError(f"The file is not a valid PDF: {e}")
+    if page_count > max_pages:
+        raise IngestError(f"The PDF has {page_count} pages, at most {max_pages} are allowed", status_code=413)
+    return page_count
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    import pymupdf
+
+    with pymupdf.open(path, filetype="pdf") as pdf:
+        return [pdf[number].get_text() for number in range(start, stop)]
+
+
+async def extract_pdf_pages(path: str) -> List[str]:
+    """Extract the text of every page, large documents are split across the process pool"""
+    page_count = await run_in_threadpool(count_pages, path, settings.max_pages)
+    if page_count < settings.parallel_min_pages or settings.workers < 2:
+        return await run_in_threadpool(extract_page_range, path, 0, page_count)
+
+    step = -(-page_count // settings.workers)
+    loop = asyncio.get_running_loop()
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(get_process_pool(), extract_page_range, path, start, min(start + step, page_count))
+        for start in range(0, page_count, step)
+    ))
+    return [page for chunk in chunks for page in chunk]
+
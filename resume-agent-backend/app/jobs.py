@@ -0,0 +1,388 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Tuple
+
+from .cache import normalize_text
+from .concurrency import BackendUnavailable, ConcurrencyLimitExceeded, background_var
+from .ingest import IngestError
+from .metrics import ERRORS, trace_id_var
+
+JobKind = Literal["text", "pdf"]
+# queued -> running -> done | failed, a running job whose worker died goes back to queued
+PENDING = ("queued", "running")
+
+
+@dataclass
+class Job:
+    id: str
+    owner: str
+    kind: JobKind
+    mode: str
+    payload: bytes
+    attempts: int
+    postponed: int = 0
+
+
+# runs a job and returns the parsed resume and the response headers to serve with it
+JobHandler = Callable[[Job], Awaitable[Tuple[dict, Dict[str, str]]]]
+
+
+def dedup_key(owner: str, kind: JobKind, mode: str, payload: bytes) -> str:
+    """Identical submissions by the same user share one job, text is compared after normalization"""
+    if kind == "text":
+        payload = normalize_text(payload.decode("utf-8")).encode("utf-8")
+    digest = hashlib.sha256()
+    for part in (owner.encode("utf-8"), kind.encode(), mode.encode(), payload):
+        digest.update(part)
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@dataclass
+class JobSettings:
+    db_path: str = os.path.join(tempfile.gettempdir(), "resume-agent-jobs.sqlite3")
+    workers: int = 2
+    # seconds a finished job and its result are kept
+    result_ttl: float = 24 * 3600.0
+    max_attempts: int = 3
+    # times a job is queued again because the LLM side is busy or down before that counts as an attempt
+    max_postponements: int = 30
+    # a running job whose lease was not renewed for this long is assumed to have lost its worker and is queued again
+    lease: float = 600.0
+    # how often idle workers check the database for jobs submitted by other processes
+    poll_interval: float = 1.0
+    cleanup_interval: float = 300.0
+    # longest long-poll a client can ask for
+    max_wait: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "JobSettings":
+        return cls(
+            db_path=os.environ.get("JOBS_DB_PATH", cls.db_path),
+            workers=int(os.environ.get("JOBS_WORKERS", cls.workers)),
+            result_ttl=float(os.environ.get("JOBS_RESULT_TTL", cls.result_ttl)),
+            max_attempts=int(os.environ.get("JOBS_MAX_ATTEMPTS", cls.max_attempts)),
+            max_postponements=int(os.environ.get("JOBS_MAX_POSTPONEMENTS", cls.max_postponements)),
+            lease=float(os.environ.get("JOBS_LEASE", cls.lease)),
+            poll_interval=float(os.environ.get("JOBS_POLL_INTERVAL", cls.poll_interval)),
+            cleanup_interval=float(os.environ.get("JOBS_CLEANUP_INTERVAL", cls.cleanup_interval)),
+            max_wait=float(os.environ.get("JOBS_MAX_WAIT", cls.max_wait)),
+        )
+
+
+class JobQueue:
+    """Durable queue of parse jobs in a local SQLite file, worked off by a pool of asyncio workers.
+
+    Submitting returns at once with a job id; the payload (resume text or PDF bytes) is stored with
+    the job, so queued and interrupted jobs survive a restart. Workers claim jobs in submission order
+    inside an immediate transaction, so several processes can share one database file. Failed jobs are
+    retried with backoff up to ``max_attempts`` times, except for uploads that cannot be parsed. Jobs
+    pushed back by the LLM side are postponed without using up an attempt, up to ``max_postponements`` times.
+    Finished jobs are deleted ``result_ttl`` seconds after they finish.
+    """
+
+    def __init__(self, handler: JobHandler, settings: Optional[JobSettings] = None):
+        self.handler = handler
+        self.settings = settings or JobSettings.from_env()
+        self._lock = threading.Lock()
+        # autocommit mode, transactions are opened explicitly where a read and write must be atomic
+        self._db = sqlite3.connect(self.settings.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, owner TEXT NOT NULL, dedup_key TEXT NOT NULL, kind TEXT NOT NULL, "
+            "mode TEXT NOT NULL, payload BLOB, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "result TEXT, headers TEXT, error TEXT, created REAL NOT NULL, updated REAL NOT NULL, "
+            "run_after REAL NOT NULL, finished REAL, postponed INTEGER NOT NULL DEFAULT 0)"
+        )
+        # databases created before jobs could be postponed
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(jobs)")]
+        if "postponed" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN postponed INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, run_after, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key)")
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, Job] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Optional[asyncio.Condition] = None
+
+    # -- database, blocking, called through asyncio.to_thread ------------------------------------
+
+    def submit(self, owner: str, kind: JobKind, payload: bytes, mode: str) -> Tuple[str, bool]:
+        """Queue a job and return its id, or the id of an identical pending or finished job and True"""
+        key = dedup_key(owner, kind, mode, payload)
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id FROM jobs WHERE dedup_key = ? AND status != 'failed' ORDER BY created DESC LIMIT 1", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("COMMIT")
+                    return row[0], True
+                job_id = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO jobs (id, owner, dedup_key, kind, mode, payload, status, created, updated, run_after) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (job_id, owner, key, kind, mode, payload, now, now, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id, False
+
+    def get(self, job_id: str, owner: str) -> Optional[dict]:
+        """The job as served by the API, None when it does not exist or belongs to someone else"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, attempts, result, headers, error, created, finished FROM jobs WHERE id = ? AND owner = ?",
+                (job_id, owner),
+            ).fetchone()
+        if row is None:
+            return None
+        status, attempts, result, headers, error, created, finished = row
+        job = {"job_id": job_id, "status": status, "attempts": attempts, "created": created, "finished": finished}
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = json.loads(error)
+        job["headers"] = json.loads(headers) if headers else {}
+        return job
+
+    def claim(self) -> Optional[Job]:
+        """Take the oldest runnable job and mark it running"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, owner, kind, mode, payload, attempts, postponed FROM jobs "
+                    "WHERE status = 'queued' AND run_after <= ? ORDER BY created LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?", (now, row[0])
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, owner, kind, mode, payload, attempts, postponed = row
+        return Job(job_id, owner, kind, mode, payload, attempts + 1, postponed)
+
+    # complete, fail and postpone only touch the job while it is still this attempt: once it was queued
+    # again, e.g. by requeue_stale in another process, the attempt's outcome is dropped
+    OWN_ATTEMPT = "id = ? AND status = 'running' AND attempts = ?"
+
+    def complete(self, job: Job, result: dict, headers: Dict[str, str]) -> bool:
+        now = time.time()
+        with self._lock:
+            # the payload is no longer needed once the job has a result
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, headers = ?, error = NULL, payload = NULL, "
+                f"updated = ?, finished = ? WHERE {self.OWN_ATTEMPT}",
+                (json.dumps(result), json.dumps(headers), now, now, job.id, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: Exception, retry: bool) -> bool:
+        now = time.time()
+        details = json.dumps({"type": type(error).__name__, "detail": str(error)})
+        with self._lock:
+            if retry and job.attempts < self.settings.max_attempts:
+                # exponential backoff: 2, 4, 8... seconds
+                cursor = self._db.execute(
+                    f"UPDATE jobs SET status = 'queued', error = ?, updated = ?, run_after = ? WHERE {self.OWN_ATTEMPT}",
+                    (details, now, now + 2 ** job.attempts, job.id, job.attempts),
+                )
+            else:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, payload = NULL, updated = ?, finished = ? "
+                    f"WHERE {self.OWN_ATTEMPT}",
+                    (details, now, now, job.id, job.attempts),
+                )
+        return cursor.rowcount == 1
+
+    def postpone(self, job: Job, error: Exception, delay: float) -> bool:
+        """Queue the job again in ``delay`` seconds (at least one) without counting the attempt, for pushback rather than failure"""
+        now = time.time()
+        details = json.dumps({"type": type(error).__name__, "detail": str(error)})
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, postponed = postponed + 1, error = ?, "
+                f"updated = ?, run_after = ? WHERE {self.OWN_ATTEMPT}",
+                (details, now, now + max(delay, 1.0), job.id, job.attempts),
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, jobs: List[Job]) -> None:
+        """Renew the lease of jobs this process is running, so requeue_stale leaves them alone however long they take"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                f"UPDATE jobs SET updated = ? WHERE {self.OWN_ATTEMPT}",
+                [(now, job.id, job.attempts) for job in jobs],
+            )
+
+    def requeue(self, job_ids: List[str]) -> None:
+        """Queue again jobs this process was running when it shut down"""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET status = 'queued', attempts = attempts - 1, updated = ?, run_after = ? "
+                "WHERE id = ? AND status = 'running'",
+                [(now, now, job_id) for job_id in job_ids],
+            )
+
+    def requeue_stale(self, running: List[str] = ()) -> int:
+        """Queue again the running jobs whose worker stopped, e.g. because the server restarted mid-parse.
+
+        A job's lease is renewed by heartbeat while it runs, and the ``running`` ids of this process are never stale.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = 'queued', updated = ?, run_after = ? WHERE status = 'running' AND updated < ? "
+                f"AND id NOT IN ({', '.join('?' * len(running))})",
+                (now, now, now - self.settings.lease, *running),
+            )
+        return cursor.rowcount
+
+    def cleanup(self) -> int:
+        """Delete finished jobs older than ``result_ttl``"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                (time.time() - self.settings.result_ttl,),
+            )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {
+            "workers": self.settings.workers,
+            **{status: counts.get(status, 0) for status in ("queued", "running", "done", "failed")},
+        }
+
+    @staticmethod
+    def pushed_back(error: Exception) -> bool:
+        """Whether the LLM side turned the job away without trying it: no free slot, or every backend's breaker open"""
+        if isinstance(error, BackendUnavailable):
+            return not error.attempted
+        return isinstance(error, ConcurrencyLimitExceeded)
+
+    # -- asyncio side ----------------------------------------------------------------------------
+
+    async def asubmit(self, owner: str, kind: JobKind, payload: bytes, mode: str) -> Tuple[str, bool]:
+        job_id, deduplicated = await asyncio.to_thread(self.submit, owner, kind, payload, mode)
+        if self._wakeup is not None and not deduplicated:
+            self._wakeup.set()
+        return job_id, deduplicated
+
+    async def aget(self, job_id: str, owner: str, wait: float = 0.0) -> Optional[dict]:
+        """The job, waiting up to ``wait`` seconds (capped at ``max_wait``) for it to finish"""
+        deadline = time.monotonic() + min(max(wait, 0.0), self.settings.max_wait)
+        while True:
+            job = await asyncio.to_thread(self.get, job_id, owner)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] not in PENDING or remaining <= 0 or self._finished is None:
+                return job
+            # woken when a worker in this process finishes a job, polls for workers in other processes
+            async with self._finished:
+                try:
+                    await asyncio.wait_for(self._finished.wait(), timeout=min(remaining, self.settings.poll_interval))
+                except asyncio.TimeoutError:
+                    pass
+
+    async def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._finished = asyncio.Condition()
+        requeued = await asyncio.to_thread(self.requeue_stale)
+        if requeued:
+            print(f"jobs: requeued {requeued} interrupted jobs")
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.settings.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # interrupted jobs run again on the next start, jobs of a process that crashed once their lease runs out
+        self.requeue(list(self._running))
+        self._running.clear()
+        with self._lock:
+            self._db.close()
+
+    async def _work(self) -> None:
+        while True:
+            job = await asyncio.to_thread(self.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.settings.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # the job id is the trace id of everything logged while the job runs
+            trace_token = trace_id_var.set(job.id)
+            # jobs wait for an LLM slot instead of being rejected like interactive requests
+            background_token = background_var.set(True)
+            self._running[job.id] = job
+            try:
+                result, headers = await self.handler(job)
+                if not await asyncio.to_thread(self.complete, job, result, headers):
+                    print(f"trace={job.id} job attempt {job.attempts} finished after the job was queued again, result dropped")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.pushed_back(e) and job.postponed < self.settings.max_postponements:
+                    # the LLM side is busy or down, not the job's fault: try again later without using up an attempt
+                    print(f"trace={job.id} job postponed {e.retry_after}s: {e}")
+                    await asyncio.to_thread(self.postpone, job, e, e.retry_after)
+                else:
+                    print(f"trace={job.id} job attempt {job.attempts} failed: {e}")
+                    ERRORS.inc(stage="job", type=type(e).__name__)
+                    # an upload that cannot be parsed fails the same way every time
+                    await asyncio.to_thread(self.fail, job, e, not isinstance(e, IngestError))
+            finally:
+                background_var.reset(background_token)
+                trace_id_var.reset(trace_token)
+            del self._running[job.id]
+
+            async with self._finished:
+                self._finished.notify_all()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            # several renewals per lease, so a slow database write does not cost a job its lease
+            await asyncio.sleep(self.settings.lease / 4)
+            try:
+                await asyncio.to_thread(self.heartbeat, list(self._running.values()))
+            except sqlite3.Error as e:
+                print(f"jobs: heartbeat failed: {e}")
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.settings.cleanup_interval)
+            try:
+                await asyncio.to_thread(self.requeue_stale, list(self._running))
+                await asyncio.to_thread(self.cleanup)
+            except sqlite3.Error as e:
+                print(f"jobs: maintenance failed: {e}")
@@ -1,9 +1,34 @@
-from typing import List, Optional
-from pydantic import BaseModel, Field
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
-from langchain.utils.openai_functions import convert_pydantic_to_openai_function
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, Type,
+                    Union, get_args, get_origin)
+import httpx
+from pydantic import BaseModel, Field, ValidationError
+from .cache import ParseCache, make_key
+from .concurrency import LLMLimiter
+from .metrics import ERRORS, stage, trace_id_var
+from .streaming import FieldEmitter
+from .sections import split_entries, split_sections
+from .revisions import get_revision_store
+
+# langchain is imported where the chains are built, not at import time, so the server starts
+# (and answers health checks) before paying for it, see "Cold start" in the README
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+# bump whenever the Resume models change so cached parses of the old shape are not served
+RESUME_SCHEMA_VERSION = "1"
+
+# "single" extracts the whole Resume in one function call, "sections" extracts each section concurrently
+ExtractionMode = Literal["single", "sections"]
+
+parse_cache = ParseCache.from_env()
+llm_limiter = LLMLimiter.from_env()
+# times the prompt, llm and parse steps of every chain and counts their tokens and cost, see metrics_callbacks()
+_metrics_callbacks: Optional[list] = None
 
 class WorkExperience(BaseModel):
     """Describe work experiences in a more concise and impactful manner. 
@@ -58,25 +83,452 @@ class Resume(BaseModel):
     hobbies: Optional[List[str]] = Field(None, title="Hobbies", description="List of hobbies or interests of the candidate")
 
 
+class ResumeHeader(BaseModel):
+    """Contains the contact details and profile of the candidate extracted or summarized from a resume.
+        Include a title that indicate the professional role or career profile of the candidate.
+        Include a summary of the candidate's professional experience and background in 2-3 sentences.
+    """
+    first_name: str = Field(..., title="First Name", description="First name of the candidate")
+    last_name: str = Field(..., title="Last Name", description="Last name of the candidate")
+    email: str = Field(..., title="Email", description="Email of the candidate")
+    phone: Optional[str] = Field(..., title="Phone", description="Phone number of the candidate")
+    resume_title: Optional[str] = Field(None, title="Resume Title", description="Title of the candidate indicating the professional role or career profile of the candidate")
+    resume_summary: Optional[str] = Field(None, title="Resume Summary", description="Summary of the candidate's professional background")
+    hobbies: Optional[List[str]] = Field(None, title="Hobbies", description="List of hobbies or interests of the candidate")
+
+class WorkExperiences(BaseModel):
+    """Contains the work experiences listed in the experience section of a resume."""
+    work_experiences: List[WorkExperience] = Field(..., title="Work Experiences", description="List of work experiences")
+
+class Educations(BaseModel):
+    """Contains the educations listed in the education section of a resume."""
+    educations: List[Education] = Field(..., title="Educations", description="List of educations")
 
-def resume_to_json(resume_text: str) -> str:
-    """Convert a Resume object to a JSON string"""
-    work_parsing_function = convert_pydantic_to_openai_function(Resume)
-    
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "Read the user input carefully and extract relevant information from the resume."),
-        ("user", "{input}")
-    ])
-
-    model = ChatOpenAI()
-
-    model_with_funcs = model.bind(
-        functions=[work_parsing_function],
-        function_call={"name": "Resume"}
+class Skills(BaseModel):
+    """Contains the skills listed in the skills section of a resume."""
+    skills: List[Skill] = Field(..., title="Skills", description="List of skills")
+
+class Projects(BaseModel):
+    """Contains the projects listed in the projects section of a resume."""
+    projects: List[Project] = Field(..., title="Projects", description="List of projects")
+
+# model used for each section in "sections" mode, and the sections of text it reads;
+# the header also reads the experience so it can summarize the candidate's background
+SECTION_MODELS = {
+    "header": (ResumeHeader, ("header", "experience")),
+    "experience": (WorkExperiences, ("experience",)),
+    "education": (Educations, ("education",)),
+    "skills": (Skills, ("skills",)),
+    "projects": (Projects, ("projects",)),
+}
+
+
+class ExtractionError(Exception):
+    """Raised when the LLM's output for a section does not fit its model, the server answers it with 502"""
+
+    def __init__(self, section: str, error: ValidationError):
+        first = error.errors()[0]
+        location = ".".join(str(part) for part in first["loc"])
+        super().__init__(f"The model returned an invalid {section} section ({location}: {first['msg']})")
+        self.section = section
+
+
+def _item_model(annotation) -> Optional[Type[BaseModel]]:
+    """The model of a ``List[Model]`` or ``Optional[List[Model]]`` field, None for any other field"""
+    if get_origin(annotation) is Union:
+        annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), None)
+    if get_origin(annotation) is not list:
+        return None
+    item = get_args(annotation)[0]
+    return item if isinstance(item, type) and issubclass(item, BaseModel) else None
+
+
+def validate_output(schema: Type[BaseModel], output: Any, section: str) -> dict:
+    """Check a function call result against its model.
+
+    Items of list fields that do not validate (e.g. a skill without a proficiency) are dropped,
+    anything else that does not validate raises ExtractionError naming ``section``.
+    """
+    try:
+        schema.model_validate(output)
+        return output
+    except ValidationError as e:
+        error = e
+    if not isinstance(output, dict):
+        raise ExtractionError(section, error)
+    repaired = dict(output)
+    for field, info in schema.model_fields.items():
+        item_model, items = _item_model(info.annotation), repaired.get(field)
+        if item_model is None or not isinstance(items, list):
+            continue
+        valid = []
+        for item in items:
+            try:
+                item_model.model_validate(item)
+            except ValidationError as e:
+                ERRORS.inc(stage="merge", type="ValidationError")
+                print(f"trace={trace_id_var.get()} dropped an invalid {section} item: {e.errors()[0]['msg']} in {item!r}")
+                continue
+            valid.append(item)
+        repaired[field] = valid
+    try:
+        schema.model_validate(repaired)
+    except ValidationError as e:
+        raise ExtractionError(section, e)
+    return repaired
+
+
+def validate_section(name: str, output: dict) -> dict:
+    """Check a section's function call result against its SECTION_MODELS model, see validate_output"""
+    return validate_output(SECTION_MODELS[name][0], output, name)
+
+
+@dataclass
+class ExtractorSettings:
+    model: str = "gpt-3.5-turbo"
+    temperature: float = 0.7
+    base_url: Optional[str] = None
+    # defaults to OPENAI_API_KEY
+    api_key: Optional[str] = None
+    # seconds, the read timeout bounds a single LLM response
+    connect_timeout: float = 10.0
+    read_timeout: float = 120.0
+    max_retries: int = 2
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 60.0
+
+    @classmethod
+    def from_env(cls) -> "ExtractorSettings":
+        return cls(
+            model=os.environ.get("OPENAI_MODEL", cls.model),
+            temperature=float(os.environ.get("OPENAI_TEMPERATURE", cls.temperature)),
+            base_url=os.environ.get("OPENAI_BASE_URL") or None,
+            connect_timeout=float(os.environ.get("OPENAI_CONNECT_TIMEOUT", cls.connect_timeout)),
+            read_timeout=float(os.environ.get("OPENAI_READ_TIMEOUT", cls.read_timeout)),
+            max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", cls.max_retries)),
+            max_connections=int(os.environ.get("OPENAI_MAX_CONNECTIONS", cls.max_connections)),
+            max_keepalive_connections=int(os.environ.get("OPENAI_MAX_KEEPALIVE", cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", cls.keepalive_expiry)),
+        )
+
+
+def metrics_callbacks() -> list:
+    global _metrics_callbacks
+    if _metrics_callbacks is None:
+        from .callbacks import MetricsCallbackHandler
+        _metrics_callbacks = [MetricsCallbackHandler()]
+    return _metrics_callbacks
+
+
+def build_chat_model(settings: ExtractorSettings) -> Tuple["ChatOpenAI", httpx.Client, httpx.AsyncClient]:
+    """A ChatOpenAI with its own pooled keep-alive HTTP clients, returned so the caller can close them"""
+    from langchain_openai import ChatOpenAI
+
+    timeout = httpx.Timeout(settings.read_timeout, connect=settings.connect_timeout)
+    limits = httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_expiry,
     )
+    http_client = httpx.Client(timeout=timeout, limits=limits)
+    http_async_client = httpx.AsyncClient(timeout=timeout, limits=limits)
+
+    model = ChatOpenAI(
+        model=settings.model,
+        temperature=settings.temperature,
+        base_url=settings.base_url,
+        api_key=settings.api_key,
+        timeout=timeout,
+        max_retries=settings.max_retries,
+        http_client=http_client,
+        http_async_client=http_async_client,
+    )
+    return model, http_client, http_async_client
+
+
+class ResumeExtractor:
+    """Long-lived resume to JSON extractor.
+
+    The function schema, prompt, parser and chat model are built once, and the chat model
+    shares one pooled keep-alive HTTP client across requests, so a parse only pays for the LLM call.
+    With a ``router`` (see app.model_router) each call goes to one of several models instead.
+    """
+
+    def __init__(self, settings: Optional[ExtractorSettings] = None, cache: Optional[ParseCache] = None,
+                 limiter: Optional[LLMLimiter] = None, model=None, router=None):
+        self.settings = settings or ExtractorSettings.from_env()
+        self.cache = cache if cache is not None else parse_cache
+        self.limiter = limiter if limiter is not None else llm_limiter
+        self.http_client = None
+        self.http_async_client = None
+        self.router = router
+        if router is not None:
+            if router.limiter is None:
+                router.limiter = self.limiter
+            self.model = None
+            self.chain = router.chain(Resume)
+            self.section_chains = {name: router.chain(schema) for name, (schema, _) in SECTION_MODELS.items()}
+            return
+        self.model = model if model is not None else self._build_model()
+        self.chain = self.build_chain(self.model)
+        self.section_chains = {
+            name: self.build_chain(self.model, schema) for name, (schema, _) in SECTION_MODELS.items()
+        }
+
+    def _build_model(self):
+        model, self.http_client, self.http_async_client = build_chat_model(self.settings)
+        return model
 
-    chain = prompt | model_with_funcs | JsonOutputFunctionsParser(key_name="resume")
+    @staticmethod
+    def build_chain(model, schema=Resume):
+        from langchain.prompts import ChatPromptTemplate
+        from langchain.output_parsers.openai_functions import JsonOutputFunctionsParser
+        from langchain.utils.openai_functions import convert_pydantic_to_openai_function
+
+        work_parsing_function = convert_pydantic_to_openai_function(schema)
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", "Read the user input carefully and extract relevant information from the resume."),
+            ("user", "{input}")
+        ])
+
+        model_with_funcs = model.bind(
+            functions=[work_parsing_function],
+            function_call={"name": schema.__name__}
+        )
+
+        chain = prompt | model_with_funcs | JsonOutputFunctionsParser(key_name="resume")
+        return chain.with_config(callbacks=metrics_callbacks())
+
+    def cache_key(self, resume_text: str, mode: ExtractionMode = "single") -> str:
+        model = self.router.name if self.router is not None else self.settings.model
+        return make_key(resume_text, model, RESUME_SCHEMA_VERSION, "" if mode == "single" else mode)
+
+    def extract(self, resume_text: str, mode: ExtractionMode = "single") -> dict:
+        cache_key = self.cache_key(resume_text, mode)
+        with stage("cache"):
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        inputs = self.section_inputs(resume_text) if mode == "sections" else None
+        if inputs is None:
+            output = self.chain.invoke({"input": resume_text})
+        else:
+            from langchain_core.runnables import RunnableParallel
+            parallel = RunnableParallel({name: itemgetter(name) | self.section_chains[name] for name in inputs})
+            output = self.merge_sections(parallel.invoke(inputs))
+
+        self.cache.set(cache_key, output, elapsed=time.perf_counter() - started)
+        return output
+
+    async def aextract(self, resume_text: str, mode: ExtractionMode = "single") -> dict:
+        """Async extract, each LLM call waits for a slot from the limiter"""
+        cache_key = self.cache_key(resume_text, mode)
+        with stage("cache"):
+            cached = await self.cache.aget(cache_key)
+        if cached is not None:
+            return cached
+
+        started = time.perf_counter()
+        inputs = self.section_inputs(resume_text) if mode == "sections" else None
+        if inputs is None:
+            async with self.limiter.slot():
+                output = await self.chain.ainvoke({"input": resume_text})
+        else:
+            async def run_section(name):
+                async with self.limiter.slot():
+                    return name, await self.section_chains[name].ainvoke(inputs[name])
+            outputs = await asyncio.gather(*(run_section(name) for name in inputs))
+            with stage("merge"):
+                output = self.merge_sections(dict(outputs))
+
+        await self.cache.aset(cache_key, output, elapsed=time.perf_counter() - started)
+        return output
+
+    @staticmethod
+    def section_inputs(resume_text: str) -> Optional[Dict[str, dict]]:
+        """Chain inputs for each section call, or None when the resume has no recognizable sections"""
+        sections = split_sections(resume_text)
+        if not set(sections) - {"header"}:
+            return None
+        inputs = {}
+        for name, (_, sources) in SECTION_MODELS.items():
+            if name == "header" or name in sections:
+                inputs[name] = {"input": "\n\n".join(sections[source] for source in sources if source in sections)}
+        return inputs
+
+    @staticmethod
+    def merge_sections(outputs: Dict[str, dict]) -> dict:
+        """Merge the per-section function call results into one validated Resume, see validate_section"""
+        merged = {"work_experiences": []}
+        for name, output in outputs.items():
+            merged.update(validate_section(name, output))
+        try:
+            return Resume.model_validate(merged).model_dump()
+        except ValidationError as e:
+            raise ExtractionError("resume", e)
+
+    def revision_units(self, resume_text: str) -> Optional[List[Tuple[str, str, str, dict]]]:
+        """The independently extractable units of a resume as (label, fingerprint, section, chain input).
+
+        Units are the sections of SECTION_MODELS, with the experience section split further into one
+        unit per job. The header is fingerprinted on its own text, so editing a job does not
+        re-extract it. None when the resume has no recognizable sections.
+        """
+        sections = split_sections(resume_text)
+        if not set(sections) - {"header"}:
+            return None
+        model = self.router.name if self.router is not None else self.settings.model
+        units = []
+        for name, (_, sources) in SECTION_MODELS.items():
+            if name == "header":
+                text = "\n\n".join(sections[source] for source in sources if source in sections)
+                units.append((name, make_key(sections.get(name, ""), model, RESUME_SCHEMA_VERSION, name), name, {"input": text}))
+            elif name == "experience" and name in sections:
+                for i, entry in enumerate(split_entries(sections[name])):
+                    units.append((f"{name}[{i}]", make_key(entry, model, RESUME_SCHEMA_VERSION, name), name, {"input": entry}))
+            elif name in sections:
+                units.append((name, make_key(sections[name], model, RESUME_SCHEMA_VERSION, name), name, {"input": sections[name]}))
+        return units
+
+    async def aextract_revision(self, resume_text: str, previous: Dict[str, dict]) -> Tuple[dict, Dict[str, dict], List[str], List[str]]:
+        """Extract a revision of a resume, reusing the outputs in ``previous`` for units whose text did not change.
+
+        Returns the Resume, the unit outputs by fingerprint to pass as ``previous`` next time, and the
+        labels of the reused and the extracted units. A resume without sections is extracted whole.
+        """
+        units = self.revision_units(resume_text)
+        if units is None:
+            return await self.aextract(resume_text), {}, [], ["resume"]
+
+        async def run_unit(fingerprint, section, inputs):
+            if fingerprint in previous:
+                return fingerprint, previous[fingerprint]
+            async with self.limiter.slot():
+                return fingerprint, await self.section_chains[section].ainvoke(inputs)
+
+        outputs = dict(await asyncio.gather(*(run_unit(fingerprint, section, inputs) for _, fingerprint, section, inputs in units)))
+        merged: Dict[str, dict] = {}
+        for _, fingerprint, section, _ in units:
+            if section == "experience":
+                # jobs were extracted one by one, concatenate them in resume order
+                jobs = merged.setdefault(section, {"work_experiences": []})
+                jobs["work_experiences"] += outputs[fingerprint].get("work_experiences") or []
+            else:
+                merged[section] = outputs[fingerprint]
+        with stage("merge"):
+            output = self.merge_sections(merged)
+
+        reused = [label for label, fingerprint, _, _ in units if fingerprint in previous]
+        extracted = [label for label, fingerprint, _, _ in units if fingerprint not in previous]
+        return output, outputs, reused, extracted
+
+    async def astream_fields(self, resume_text: str) -> AsyncIterator[dict]:
+        """Stream the parse as FieldEmitter events, each top-level field as soon as it is complete"""
+        emitter = FieldEmitter()
+        cache_key = self.cache_key(resume_text)
+        with stage("cache"):
+            output = await self.cache.aget(cache_key)
+        if output is None:
+            async with self.limiter.slot():
+                started = time.perf_counter()
+                async for partial in self.chain.astream({"input": resume_text}):
+                    output = partial
+                    for event in emitter.feed(partial):
+                        yield event
+            if not isinstance(output, dict):
+                raise ValueError("The model did not return a resume")
+            await self.cache.aset(cache_key, output, elapsed=time.perf_counter() - started)
+
+        for event in emitter.finish(output):
+            yield event
+
+    async def awarmup(self) -> None:
+        """Open a keep-alive connection to the provider so the first request skips the TLS handshake"""
+        if self.router is not None:
+            await self.router.awarmup()
+        if self.http_async_client is None:
+            return
+        base_url = self.settings.base_url or os.environ.get("OPENAI_BASE_URL") or "https://api.openai.com/v1"
+        try:
+            await self.http_async_client.head(base_url)
+        except httpx.HTTPError as e:
+            print(f"LLM connection warmup failed: {e}")
+
+    async def aclose(self) -> None:
+        if self.router is not None:
+            await self.router.aclose()
+        if self.http_client is not None:
+            self.http_client.close()
+        if self.http_async_client is not None:
+            await self.http_async_client.aclose()
+
+
+_extractor: Optional[ResumeExtractor] = None
+_warmup: Optional["asyncio.Task[None]"] = None
+
+
+def get_extractor() -> ResumeExtractor:
+    global _extractor
+    if _extractor is None:
+        _extractor = ResumeExtractor()
+    return _extractor
+
+
+def set_extractor(extractor: Optional[ResumeExtractor]) -> None:
+    global _extractor
+    _extractor = extractor
+
+
+def warm_extractor(build: Callable[[], Awaitable[ResumeExtractor]]) -> "asyncio.Task[None]":
+    """Build the extractor in a background task, parses started meanwhile wait for it instead of building their own.
+
+    If the build fails, every parse raises its error.
+    """
+    global _warmup
+
+    async def run() -> None:
+        set_extractor(await build())
+
+    _warmup = asyncio.create_task(run())
+    return _warmup
+
+
+async def aget_extractor() -> ResumeExtractor:
+    """The extractor, once a warmup started by warm_extractor has finished"""
+    if _warmup is not None:
+        await asyncio.shield(_warmup)
+    return get_extractor()
+
+
+def resume_to_json(resume_text: str, mode: ExtractionMode = "single") -> str:
+    """Convert a Resume object to a JSON string"""
+    return get_extractor().extract(resume_text, mode)
+
+
+async def aresume_to_json(resume_text: str, mode: ExtractionMode = "single") -> str:
+    """Async version of resume_to_json"""
+    extractor = await aget_extractor()
+    return await extractor.aextract(resume_text, mode)
+
+
+async def aresume_revision_to_json(uid: str, resume_text: str) -> Tuple[dict, List[str], List[str]]:
+    """Parse a new revision of the user's resume, re-extracting only the sections that changed since their last parse.
+
+    Returns the Resume and the labels of the reused and the extracted sections.
+    """
+    store, extractor = get_revision_store(), await aget_extractor()
+    output, units, reused, extracted = await extractor.aextract_revision(resume_text, await store.aget(uid))
+    if units:
+        await store.aset(uid, units)
+    return output, reused, extracted
 
-    output = chain.invoke({"input": resume_text})
 
-    return output
\ No newline at end of file
+async def astream_resume(resume_text: str) -> AsyncIterator[dict]:
+    """Stream the parse of a resume field by field, see FieldEmitter for the events"""
+    extractor = await aget_extractor()
+    async for event in extractor.astream_fields(resume_text):
+        yield event
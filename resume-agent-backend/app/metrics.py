@@ -0,0 +1,261 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# seconds, from a cached token check to a long LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# USD per 1K (prompt, completion) tokens, the longest matching model prefix wins
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+}
+# extra or overriding prices as JSON, e.g. {"my-model": [0.001, 0.002]}
+MODEL_PRICES.update({model: tuple(price) for model, price in json.loads(os.environ.get("LLM_PRICES", "{}")).items()})
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+# (stage, seconds) of the current request, for its log line
+_stage_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("stage_timings", default=None)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}.0"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: a count per bucket (plus +Inf), and the sum
+        self._values: Dict[LabelValues, Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """A set of metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "resume_agent_request_seconds", "Time to fully answer a request, streaming bodies included", ("method", "route", "status")))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "resume_agent_requests_in_flight", "Requests being answered, streaming bodies included"))
+STAGE_SECONDS = registry.register(Histogram(
+    "resume_agent_stage_seconds", "Time spent in each stage of a parse", ("stage",)))
+STAGES_IN_FLIGHT = registry.register(Gauge(
+    "resume_agent_stages_in_flight", "Stages currently running, llm is the number of open LLM calls", ("stage",)))
+ERRORS = registry.register(Counter(
+    "resume_agent_errors_total", "Errors by the stage they happened in and exception type", ("stage", "type")))
+LLM_TOKENS = registry.register(Counter(
+    "resume_agent_llm_tokens_total", "LLM tokens used, estimated when the provider does not report usage", ("model", "kind")))
+LLM_COST = registry.register(Counter(
+    "resume_agent_llm_cost_usd_total", "Estimated LLM cost in USD, from MODEL_PRICES", ("model",)))
+
+
+def price_of(model: str) -> Tuple[float, float]:
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else (0.0, 0.0)
+
+
+def record_tokens(model: str, prompt_tokens: int, completion_tokens: int) -> None:
+    LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+    LLM_TOKENS.inc(completion_tokens, model=model, kind="completion")
+    prompt_price, completion_price = price_of(model)
+    LLM_COST.inc((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000, model=model)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as one stage of the current request, and count the exception it raises, if any"""
+    STAGES_IN_FLIGHT.inc(stage=name)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        ERRORS.inc(stage=name, type=type(e).__name__)
+        raise
+    finally:
+        STAGES_IN_FLIGHT.dec(stage=name)
+        observe_stage(name, time.perf_counter() - started)
+
+
+def new_trace_id(header: Optional[str]) -> str:
+    """The trace id sent by the client when it is well formed, otherwise a new one"""
+    if header and _TRACE_ID_RE.match(header):
+        return header
+    return uuid.uuid4().hex
+
+
+class MetricsMiddleware:
+    """ASGI middleware that times every request, tracks requests in flight and propagates trace ids.
+
+    The trace id comes from the ``X-Trace-Id`` request header (or is generated), is available to the
+    request's code through ``trace_id_var``, is returned in the ``X-Trace-Id`` response header and
+    prefixes the per-request log line listing the time spent in each stage.
+    """
+
+    def __init__(self, app, log_requests: bool = True):
+        self.app = app
+        self.log_requests = log_requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = new_trace_id(headers.get(TRACE_HEADER.lower().encode(), b"").decode("latin-1"))
+        trace_token = trace_id_var.set(trace_id)
+        timings_token = _stage_timings.set([])
+        status = 500
+
+        async def send_with_trace(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers") or []) + [(TRACE_HEADER.lower().encode(), trace_id.encode())]
+            await send(message)
+
+        path = scope.get("path", "")
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace)
+        except Exception as e:
+            ERRORS.inc(stage="request", type=type(e).__name__)
+            raise
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            elapsed = time.perf_counter() - started
+            # the route template rather than the path, so path params do not explode the label values,
+            # plain Starlette routes have no path params
+            route = getattr(scope.get("route"), "path", None) or (path if "endpoint" in scope else "unmatched")
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route, status=status)
+            if self.log_requests and route != "/metrics":
+                # section-parallel parses run each stage several times, log the total per stage
+                totals: Dict[str, float] = {}
+                for name, seconds in _stage_timings.get() or []:
+                    totals[name] = totals.get(name, 0.0) + seconds
+                stages = " ".join(f"{name}={seconds:.3f}" for name, seconds in totals.items())
+                print(f"trace={trace_id} {scope['method']} {path} {status} {elapsed:.3f}s {stages}".rstrip())
+            _stage_timings.reset(timings_token)
+            trace_id_var.reset(trace_token)
@@ -0,0 +1,391 @@
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple, Type
+
+import httpx
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import BaseModel
+
+from .concurrency import BackendUnavailable, LLMLimiter
+from .llm import SECTION_MODELS, ExtractionError, ExtractorSettings, ResumeExtractor, build_chat_model, validate_output
+from .preprocess import get_token_counter
+
+# latency is tracked separately for inputs up to 2K, 4K, 8K tokens and longer
+LENGTH_BUCKETS = (2000, 4000, 8000)
+
+# the section named in ExtractionError for each schema, anything else is the whole resume
+SECTION_NAMES = {schema: name for name, (schema, _) in SECTION_MODELS.items()}
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures or slow calls and stays open for ``cooldown`` seconds.
+
+    After the cooldown the backend is half open: calls are let through again, the next success
+    closes the breaker and the next failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.cooldown else "half_open"
+
+    def available(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent call latencies by input length bucket"""
+
+    def __init__(self, window: int = 200, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples: Deque[Tuple[int, float]] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, tokens: int, seconds: float) -> None:
+        with self._lock:
+            self._samples.append((bisect_right(LENGTH_BUCKETS, tokens), seconds))
+
+    def quantile(self, tokens: int, q: float) -> Optional[float]:
+        """The q-quantile latency for inputs of this length, or over all lengths while the bucket has too few samples"""
+        bucket = bisect_right(LENGTH_BUCKETS, tokens)
+        with self._lock:
+            same_length = [seconds for b, seconds in self._samples if b == bucket]
+            everything = [seconds for _, seconds in self._samples]
+        for samples in (same_length, everything):
+            if len(samples) >= self.min_samples:
+                return statistics.quantiles(samples, n=100, method="inclusive")[round(q * 100) - 1]
+        return None
+
+
+class Backend:
+    """One chat model the router can send extractions to.
+
+    ``max_input_tokens`` keeps long resumes away from small-context models, ``expected_latency`` is the
+    latency assumed until enough calls were observed, and a successful call slower than
+    ``slow_call_seconds`` counts against the circuit breaker like an error.
+    """
+
+    def __init__(self, name: str, model, max_input_tokens: int = 16000, expected_latency: float = 10.0,
+                 slow_call_seconds: float = 60.0, breaker: Optional[CircuitBreaker] = None,
+                 latency: Optional[LatencyTracker] = None, base_url: Optional[str] = None, clients: Tuple = ()):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.max_input_tokens = max_input_tokens
+        self.expected_latency = expected_latency
+        self.slow_call_seconds = slow_call_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self.clients = clients
+        self._chains: Dict[Type[BaseModel], Runnable] = {}
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.wins = 0
+
+    def chain(self, schema: Type[BaseModel]) -> Runnable:
+        if schema not in self._chains:
+            self._chains[schema] = ResumeExtractor.build_chain(self.model, schema)
+        return self._chains[schema]
+
+    def expected(self, tokens: int) -> float:
+        return self.latency.quantile(tokens, 0.5) or self.expected_latency
+
+    def hedge_delay(self, tokens: int) -> float:
+        """How long to wait for this backend before hedging: its observed p95, twice the expected latency until known"""
+        return self.latency.quantile(tokens, 0.95) or 2 * self.expected_latency
+
+    def record(self, tokens: int, seconds: float, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            self.latency.record(tokens, seconds)
+        if error is not None or seconds > self.slow_call_seconds:
+            self.failures += error is not None
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def stats(self, tokens: int = 0) -> dict:
+        return {
+            "name": self.name,
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "wins": self.wins,
+            "p50": self.latency.quantile(tokens, 0.5),
+            "p95": self.latency.quantile(tokens, 0.95),
+        }
+
+    async def awarmup(self) -> None:
+        """Open a keep-alive connection to the backend, see ResumeExtractor.awarmup"""
+        for client in self.clients:
+            if isinstance(client, httpx.AsyncClient):
+                try:
+                    await client.head(self.base_url or "https://api.openai.com/v1")
+                except httpx.HTTPError as e:
+                    print(f"LLM connection warmup for {self.name} failed: {e}")
+
+    async def aclose(self) -> None:
+        for client in self.clients:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                client.close()
+
+
+@dataclass
+class BackendSettings(ExtractorSettings):
+    name: str = "openai"
+    max_input_tokens: int = 16000
+    expected_latency: float = 10.0
+    slow_call_seconds: float = 60.0
+
+
+class ModelRouter:
+    """Sends each extraction to the backend expected to answer it fastest, with hedging and failover.
+
+    Backends that fit the input and whose circuit breaker is not open are ranked by their median
+    latency for inputs of that length (``expected_latency`` until observed, ties keep the configured
+    order). When ``hedge`` is on and the chosen backend has not answered within its p95 latency, the
+    same call is also sent to the next backend, and the first answer that validates against the
+    schema wins. A hedge needs a free slot of ``limiter`` (the extractor's, when left unset), calls
+    that would have to wait for one are not hedged.
+
+    Errors and invalid answers fail over to the next backend. Only errors count against a backend's
+    circuit breaker: an answer that does not fit the schema says nothing about the backend's health.
+    When no backend could be reached the call raises BackendUnavailable, when they answered but none
+    of the answers was valid it raises the ExtractionError of the first one.
+    """
+
+    def __init__(self, backends: List[Backend], hedge: bool = True, limiter: Optional[LLMLimiter] = None):
+        if not backends:
+            raise ValueError("The router needs at least one backend")
+        self.backends = backends
+        self.hedge = hedge
+        self.limiter = limiter
+        self.count_tokens = get_token_counter("gpt-3.5-turbo")
+
+    @property
+    def name(self) -> str:
+        return "router:" + ",".join(backend.name for backend in self.backends)
+
+    @classmethod
+    def from_env(cls, defaults: Optional[ExtractorSettings] = None) -> Optional["ModelRouter"]:
+        """A router over the backends in MODEL_BACKENDS (a JSON list of BackendSettings fields), None when unset"""
+        config = os.environ.get("MODEL_BACKENDS")
+        if not config:
+            return None
+        defaults = defaults or ExtractorSettings.from_env()
+        base = {field.name: getattr(defaults, field.name) for field in fields(ExtractorSettings)}
+        breaker_threshold = int(os.environ.get("ROUTER_FAILURE_THRESHOLD", "3"))
+        breaker_cooldown = float(os.environ.get("ROUTER_COOLDOWN", "30"))
+
+        backends = []
+        for options in json.loads(config):
+            settings = replace(BackendSettings(**base), **options)
+            model, http_client, http_async_client = build_chat_model(settings)
+            backends.append(Backend(
+                settings.name,
+                model,
+                max_input_tokens=settings.max_input_tokens,
+                expected_latency=settings.expected_latency,
+                slow_call_seconds=settings.slow_call_seconds,
+                breaker=CircuitBreaker(breaker_threshold, breaker_cooldown),
+                base_url=settings.base_url,
+                clients=(http_client, http_async_client),
+            ))
+        return cls(backends, hedge=os.environ.get("ROUTER_HEDGE", "true").lower() == "true")
+
+    def candidates(self, tokens: int) -> List[Backend]:
+        """Backends that can take the input, fastest expected first"""
+        fitting = [backend for backend in self.backends if tokens <= backend.max_input_tokens]
+        if not fitting:
+            # an input too long for every backend is still worth a try on the largest one
+            fitting = [max(self.backends, key=lambda backend: backend.max_input_tokens)]
+        available = [backend for backend in fitting if backend.breaker.available()]
+        return sorted(available, key=lambda backend: backend.expected(tokens))
+
+    def chain(self, schema: Type[BaseModel]) -> "RoutedChain":
+        return RoutedChain(router=self, schema=schema)
+
+    @staticmethod
+    def validate(schema: Type[BaseModel], output: Any) -> dict:
+        """The answer checked like validate_section does, invalid list items dropped, see validate_output"""
+        output = validate_output(schema, output, SECTION_NAMES.get(schema, "resume"))
+        return schema.model_validate(output).model_dump()
+
+    @staticmethod
+    def unavailable(errors: List[str], invalid: List[ExtractionError]) -> Exception:
+        if invalid:
+            return invalid[0]
+        return BackendUnavailable("No model backend could parse the resume" + (f" ({'; '.join(errors)})" if errors else ""),
+                                  attempted=bool(errors))
+
+    def invoke(self, schema: Type[BaseModel], inputs: dict, config: Optional[RunnableConfig] = None) -> dict:
+        """Try the backends in order, without hedging"""
+        tokens = self.count_tokens(inputs["input"])
+        errors, invalid = [], []
+        for backend in self.candidates(tokens):
+            backend.calls += 1
+            started = time.perf_counter()
+            try:
+                output = backend.chain(schema).invoke(inputs, config)
+            except Exception as e:
+                backend.record(tokens, time.perf_counter() - started, e)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            backend.record(tokens, time.perf_counter() - started)
+            try:
+                output = self.validate(schema, output)
+            except ExtractionError as e:
+                invalid.append(e)
+                continue
+            backend.wins += 1
+            return output
+        raise self.unavailable(errors, invalid)
+
+    async def _acall(self, backend: Backend, schema: Type[BaseModel], inputs: dict, tokens: int,
+                     config: Optional[RunnableConfig], hedged: bool = False) -> dict:
+        backend.calls += 1
+        started = time.perf_counter()
+        try:
+            output = await backend.chain(schema).ainvoke(inputs, config)
+        except asyncio.CancelledError:
+            # a hedged call that lost the race, it only counts against the backend if it was slow
+            if time.perf_counter() - started > backend.slow_call_seconds:
+                backend.breaker.record_failure()
+            raise
+        except Exception as e:
+            backend.record(tokens, time.perf_counter() - started, e)
+            raise
+        finally:
+            if hedged:
+                self.limiter.release()
+        backend.record(tokens, time.perf_counter() - started)
+        return self.validate(schema, output)
+
+    async def ainvoke(self, schema: Type[BaseModel], inputs: dict, config: Optional[RunnableConfig] = None) -> dict:
+        tokens = self.count_tokens(inputs["input"])
+        waiting = self.candidates(tokens)
+        running: Dict[asyncio.Task, Backend] = {}
+        errors, invalid = [], []
+        hedge = self.hedge
+
+        def launch(hedged: bool = False):
+            backend = waiting.pop(0)
+            running[asyncio.ensure_future(self._acall(backend, schema, inputs, tokens, config, hedged))] = backend
+            return backend
+
+        if waiting:
+            launch()
+        try:
+            while running:
+                # at most one hedge in flight, started once the only running call passes its backend's p95
+                timeout = None
+                if hedge and waiting and len(running) == 1:
+                    timeout = next(iter(running.values())).hedge_delay(tokens)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # the caller holds one slot for the call, the hedge runs in a second one
+                    if self.limiter is None or self.limiter.try_acquire():
+                        launch(hedged=self.limiter is not None).hedges += 1
+                    else:
+                        hedge = False
+                    continue
+                for task in done:
+                    backend = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        backend.wins += 1
+                        return task.result()
+                    if isinstance(error, ExtractionError):
+                        invalid.append(error)
+                    else:
+                        errors.append(f"{backend.name}: {error}")
+                if not running and waiting:
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+        raise self.unavailable(errors, invalid)
+
+    async def astream(self, schema: Type[BaseModel], inputs: dict, config: Optional[RunnableConfig] = None) -> AsyncIterator[Any]:
+        """Stream from the fastest backend, failing over only while nothing has been streamed yet"""
+        tokens = self.count_tokens(inputs["input"])
+        errors, invalid = [], []
+        for backend in self.candidates(tokens):
+            backend.calls += 1
+            started = time.perf_counter()
+            output = None
+            try:
+                async for output in backend.chain(schema).astream(inputs, config):
+                    yield output
+            except Exception as e:
+                backend.record(tokens, time.perf_counter() - started, e)
+                if output is not None:
+                    raise
+                errors.append(f"{backend.name}: {e}")
+                continue
+            backend.record(tokens, time.perf_counter() - started)
+            try:
+                self.validate(schema, output)
+            except ExtractionError as e:
+                # what was streamed cannot be taken back, an invalid answer ends the stream
+                if output is not None:
+                    raise
+                invalid.append(e)
+                continue
+            backend.wins += 1
+            return
+        raise self.unavailable(errors, invalid)
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends]
+
+    async def awarmup(self) -> None:
+        await asyncio.gather(*(backend.awarmup() for backend in self.backends))
+
+    async def aclose(self) -> None:
+        for backend in self.backends:
+            await backend.aclose()
+
+
+class RoutedChain(Runnable):
+    """A Runnable over one schema's extraction chain, run through the router"""
+
+    def __init__(self, router: ModelRouter, schema: Type[BaseModel]):
+        self.router = router
+        self.schema = schema
+
+    def invoke(self, input: dict, config: Optional[RunnableConfig] = None, **kwargs) -> dict:
+        return self.router.invoke(self.schema, input, config)
+
+    async def ainvoke(self, input: dict, config: Optional[RunnableConfig] = None, **kwargs) -> dict:
+        return await self.router.ainvoke(self.schema, input, config)
+
+    async def astream(self, input: dict, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        async for output in self.router.astream(self.schema, input, config):
+            yield output
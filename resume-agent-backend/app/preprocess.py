@@ -0,0 +1,183 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, List, Literal, Optional
+
+from .sections import DATE_RANGE_RE, section_of
+
+# "head" keeps the start of the resume, "sections" keeps the header and shares the rest of the budget
+# between sections, trimming the largest ones, so short sections (education, skills) survive a long work history
+TruncationPolicy = Literal["head", "sections"]
+
+# characters that carry no meaning for the LLM but cost tokens
+_INVISIBLE = dict.fromkeys(map(ord, "\u00ad\u200b\u200c\u200d\u2060\ufeff"), None)
+_PAGE_NUMBER = re.compile(r"^(page\s*)?\d{1,3}(\s*(of|/)\s*\d{1,3})?$|^[-–—]\s*\d{1,3}\s*[-–—]$", re.IGNORECASE)
+# lines this close to the top or bottom of a page are candidates for running headers and footers
+EDGE_LINES = 3
+
+
+@dataclass
+class PreprocessSettings:
+    token_budget: int = 6000
+    policy: TruncationPolicy = "sections"
+    tokenizer_model: str = "gpt-3.5-turbo"
+
+    @classmethod
+    def from_env(cls) -> "PreprocessSettings":
+        return cls(
+            token_budget=int(os.environ.get("PREPROCESS_TOKEN_BUDGET", cls.token_budget)),
+            policy=os.environ.get("PREPROCESS_TRUNCATION_POLICY", cls.policy),
+            tokenizer_model=os.environ.get("OPENAI_MODEL", cls.tokenizer_model),
+        )
+
+
+@dataclass
+class PreprocessResult:
+    text: str
+    tokens_before: int
+    tokens_after: int
+    truncated: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def headers(self) -> dict:
+        return {
+            "X-Tokens-Before": str(self.tokens_before),
+            "X-Tokens-After": str(self.tokens_after),
+            "X-Tokens-Saved": str(self.tokens_saved),
+            "X-Tokens-Truncated": str(self.truncated).lower(),
+        }
+
+
+@lru_cache(maxsize=8)
+def get_token_counter(model: str) -> Callable[[str], int]:
+    """Count tokens with the model's tiktoken encoding, or estimate 4 characters per token without it"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken unavailable, estimating token counts: {e}")
+        return lambda text: (len(text) + 3) // 4
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def _clean_line(line: str) -> str:
+    line = unicodedata.normalize("NFKC", line).translate(_INVISIBLE)
+    return " ".join(line.split())
+
+
+def _furniture_key(line: str) -> Optional[str]:
+    """The line with digits ignored, to match running headers and footers like "Jane Doe - Page 2".
+
+    None for lines that are never page furniture: lines without letters and lines with a date range,
+    which would otherwise match each other, e.g. the "2014 - 2016" and "2011 - 2013" of two jobs.
+    """
+    if not re.search(r"[^\W\d_]", line) or DATE_RANGE_RE.search(line):
+        return None
+    return re.sub(r"\d+", "#", line)
+
+
+def _repeated_edge_lines(pages: List[List[str]]) -> set:
+    """Lines found at the top or bottom of at least half the pages (and at least two), see _furniture_key"""
+    if len(pages) < 2:
+        return set()
+    counts = Counter()
+    for lines in pages:
+        edges = lines[:EDGE_LINES] + lines[-EDGE_LINES:]
+        counts.update({_furniture_key(line) for line in edges} - {None})
+    threshold = max(2, (len(pages) + 1) // 2)
+    return {line for line, count in counts.items() if count >= threshold}
+
+
+def normalize_pages(pages: List[str]) -> str:
+    """Normalize whitespace and unicode, and drop page numbers and running headers/footers.
+
+    A repeated header is kept on the first page, since on a resume it is usually the contact details.
+    """
+    cleaned = [[line for line in map(_clean_line, page.splitlines()) if line] for page in pages]
+    repeated = _repeated_edge_lines(cleaned)
+
+    out = []
+    for number, lines in enumerate(cleaned):
+        for position, line in enumerate(lines):
+            at_edge = position < EDGE_LINES or position >= len(lines) - EDGE_LINES
+            if at_edge and _PAGE_NUMBER.match(line):
+                continue
+            if number > 0 and at_edge and _furniture_key(line) in repeated:
+                continue
+            # keep a blank line before headings so sections stay easy to tell apart
+            if section_of(line) is not None and out and out[-1]:
+                out.append("")
+            out.append(line)
+    return "\n".join(out).strip()
+
+
+def _truncate_lines(lines: List[str], budget: int, count: Callable[[str], int]) -> List[str]:
+    kept, used = [], 0
+    for line in lines:
+        cost = count(line + "\n")
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def truncate(text: str, budget: int, policy: TruncationPolicy, count: Callable[[str], int]) -> str:
+    """Cut ``text`` down to about ``budget`` tokens on line boundaries"""
+    lines = text.splitlines()
+    if policy == "head":
+        return "\n".join(_truncate_lines(lines, budget, count))
+
+    # group lines into the header followed by one block per heading
+    blocks = [[]]
+    for line in lines:
+        if section_of(line) is not None:
+            blocks.append([])
+        blocks[-1].append(line)
+    header = _truncate_lines(blocks[0], budget, count)
+    remaining = budget - count("\n".join(header) + "\n")
+
+    # smallest sections first: each gets an equal share of what is left, unused share rolls over
+    kept = {}
+    rest = sorted(range(1, len(blocks)), key=lambda i: count("\n".join(blocks[i])))
+    for position, i in enumerate(rest):
+        share = max(0, remaining) // (len(rest) - position)
+        kept[i] = _truncate_lines(blocks[i], share, count)
+        remaining -= count("".join(line + "\n" for line in kept[i]))
+    return "\n".join(line for block in [header] + [kept[i] for i in sorted(kept)] for line in block)
+
+
+def preprocess_pages(pages: List[str], settings: PreprocessSettings = None) -> PreprocessResult:
+    """Clean up extracted resume pages and fit them into the token budget before the LLM call"""
+    settings = settings or default_settings
+    count = get_token_counter(settings.tokenizer_model)
+    tokens_before = count("".join(pages))
+
+    text = normalize_pages(pages)
+    truncated = False
+    if settings.token_budget > 0 and count(text) > settings.token_budget:
+        text = truncate(text, settings.token_budget, settings.policy, count)
+        truncated = True
+    return PreprocessResult(text, tokens_before, count(text), truncated)
+
+
+def preprocess_text(text: str, settings: PreprocessSettings = None) -> PreprocessResult:
+    """Like preprocess_pages, for text with its pages separated by form feeds ("\\f").
+
+    Page boundaries are only known from the form feeds, so clients sending extracted PDF text must keep
+    them (the frontend joins pages with "\\f"). Text without any is one page, and its running headers,
+    footers and page numbers are not recognized as such.
+    """
+    return preprocess_pages(text.split("\f"), settings)
+
+
+default_settings = PreprocessSettings.from_env()
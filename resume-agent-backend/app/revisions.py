@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class RevisionStore:
+    """Each user's last parse, as the extraction output of every resume section keyed by its fingerprint.
+
+    Kept in SQLite so revisions are recognized across restarts. Entries older than ``ttl`` seconds
+    are ignored and deleted (0 keeps them forever).
+    """
+    path: str = os.path.join(tempfile.gettempdir(), "resume-agent-revisions.sqlite3")
+    ttl: float = 30 * 24 * 3600.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS revisions (uid TEXT PRIMARY KEY, units TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "RevisionStore":
+        return cls(
+            path=os.environ.get("REVISIONS_DB_PATH", cls.path),
+            ttl=float(os.environ.get("REVISIONS_TTL", cls.ttl)),
+        )
+
+    def get(self, uid: str) -> Dict[str, dict]:
+        with self._lock:
+            row = self._db.execute("SELECT units, updated FROM revisions WHERE uid = ?", (uid,)).fetchone()
+            if row is None:
+                return {}
+            units, updated = row
+            if self.ttl > 0 and time.time() - updated > self.ttl:
+                self._db.execute("DELETE FROM revisions WHERE uid = ?", (uid,))
+                self._db.commit()
+                return {}
+        return json.loads(units)
+
+    def set(self, uid: str, units: Dict[str, dict]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO revisions (uid, units, updated) VALUES (?, ?, ?)",
+                (uid, json.dumps(units), time.time()),
+            )
+            self._db.commit()
+
+    async def aget(self, uid: str) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.get, uid)
+
+    async def aset(self, uid: str, units: Dict[str, dict]) -> None:
+        await asyncio.to_thread(self.set, uid, units)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_store: Optional[RevisionStore] = None
+
+
+def get_revision_store() -> RevisionStore:
+    global _store
+    if _store is None:
+        _store = RevisionStore.from_env()
+    return _store
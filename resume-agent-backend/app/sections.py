@@ -0,0 +1,93 @@
+import re
+from typing import Dict, List
+
+# headings that start a section, matched against a whole (short) line, case insensitive
+SECTION_HEADINGS = {
+    "experience": r"(work|professional|relevant|industry)?\s*(experience|employment( history)?|work history|career history)",
+    "education": r"education( and training)?|academic (background|history)|qualifications",
+    "skills": r"(technical |core |key )?(skills|competencies|technologies|tools)( (and|&) (tools|technologies))?",
+    "projects": r"(personal |selected |key |side )?projects",
+    # anything else a resume commonly has stays with the contact details and summary
+    "header": r"(professional )?(summary|profile|objective|about me)|interests|hobbies|certifications|awards|languages",
+}
+SECTIONS = ("header", "experience", "education", "skills", "projects")
+
+_HEADING_RES = {
+    name: re.compile(rf"^\W*(?:{pattern})\W*$", re.IGNORECASE) for name, pattern in SECTION_HEADINGS.items()
+}
+MAX_HEADING_LENGTH = 40
+
+
+def section_of(line: str):
+    """Return the section a heading line starts, or None if the line is not a heading"""
+    line = line.strip()
+    if not line or len(line) > MAX_HEADING_LENGTH:
+        return None
+    for name, heading in _HEADING_RES.items():
+        if heading.match(line):
+            return name
+    return None
+
+
+def split_sections(text: str) -> Dict[str, str]:
+    """Split resume text into its header, experience, education, skills and projects sections.
+
+    Text before the first heading belongs to the header. A section whose heading appears more
+    than once is concatenated. Sections without text are left out.
+    """
+    parts: Dict[str, list] = {name: [] for name in SECTIONS}
+    current = "header"
+    for line in text.splitlines():
+        section = section_of(line)
+        if section is not None:
+            current = section
+            if section == "header":
+                parts[current].append(line)
+            continue
+        parts[current].append(line)
+    return {name: "\n".join(lines).strip() for name, lines in parts.items() if "".join(lines).strip()}
+
+
+BULLET_RE = re.compile(r"^\s*[-*•·▪●–]\s*")
+# "Jan 2020 - Present", "2019 – 2021", "03/2018 to 06/2020": the dates on a job's heading
+_DATE = r"(?:(?:[A-Za-z]{3,9}\.?\s+|\d{1,2}/)?(?:19|20)\d{2})"
+DATE_RANGE_RE = re.compile(rf"{_DATE}\s*(?:-|–|—|to|until)\s*(?:{_DATE}|present|current|now|today)", re.IGNORECASE)
+# a line that follows one of these words or characters is the rest of a wrapped line, not a new heading
+_CONTINUED_END = re.compile(r"(?:[,;:&/(–-]|\b(?:and|or|of|to|the|a|an|with|for|in|on|by|at|from))\s*$", re.IGNORECASE)
+# lines after a job's first heading line that may still hold its dates, e.g. title, then company and dates
+HEADING_LOOKAHEAD = 2
+
+
+def _continues(previous: str, line: str) -> bool:
+    """Whether ``line`` is the wrapped continuation of ``previous``: indented, lowercase, or after a dangling word"""
+    return line[:1].isspace() or line.lstrip()[:1].islower() or bool(_CONTINUED_END.search(previous))
+
+
+def split_entries(text: str) -> List[str]:
+    """Split a section into entries, e.g. one per job: heading lines (title, company, dates) and the bullets under them.
+
+    After an entry's bullets, a new entry starts at a heading: a line with a date range, or the line
+    just before one (a title above the company and dates). In a section without any date ranges, any
+    non-bullet line after a bullet starts one instead. Either way, lines that continue a wrapped
+    bullet stay with it. A section without bullets is a single entry.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    dated = any(DATE_RANGE_RE.search(line) for line in lines)
+    entries: List[List[str]] = []
+    has_bullets = False
+    for i, line in enumerate(lines):
+        is_bullet = bool(BULLET_RE.match(line))
+        if not is_bullet and has_bullets and not _continues(lines[i - 1], line):
+            following = []
+            for next_line in lines[i + 1:i + 1 + HEADING_LOOKAHEAD]:
+                if BULLET_RE.match(next_line):
+                    break
+                following.append(next_line)
+            if not dated or any(DATE_RANGE_RE.search(heading) for heading in [line] + following):
+                entries.append([])
+                has_bullets = False
+        if not entries:
+            entries.append([])
+        entries[-1].append(line)
+        has_bullets = has_bullets or is_bullet
+    return ["\n".join(entry) for entry in entries]
@@ -1,71 +1,395 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Security, Depends
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import RedirectResponse
-from langserve import add_routes
-from langchain_openai import ChatOpenAI
-from langchain_community.llms import Ollama
-import pymupdf
-from .llm import resume_to_json
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import io
+import os
+import json
+import time
+import zlib
+from contextlib import asynccontextmanager, AsyncExitStack
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Tuple
+from .llm import aresume_to_json, aresume_revision_to_json, astream_resume, ExtractionError, ExtractionMode, ResumeExtractor, aget_extractor, set_extractor, warm_extractor
+from .concurrency import BackendUnavailable, ConcurrencyLimitExceeded, background_var, bounded_as_completed
+from .preprocess import PreprocessResult, preprocess_pages, preprocess_text
+from .ingest import IngestError, count_pages, extract_pdf_pages, spool_to_file, spooled_upload, shutdown_process_pool
+from .ingest import settings as ingest_settings
+from .jobs import Job, JobQueue
+from . import auth
+from .auth import get_current_user
+from .metrics import MetricsMiddleware, registry, stage, trace_id_var
 
-import firebase_admin
-from firebase_admin import credentials, auth
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "16"))
+MAX_TEXT_BODY_BYTES = int(os.environ.get("MAX_TEXT_BODY_BYTES", str(2 * 1024 * 1024)))
+# "incremental" re-extracts only the sections that changed since the user's previous parse
+ParseMode = Literal["single", "sections", "incremental"]
+# when set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+# "eager" warms up (see warm_up) before accepting requests, "lazy" accepts them right away and warms up
+# in the background, parses wait for the warmup and /readyz answers 503 until it is done
+StartupMode = Literal["eager", "lazy"]
+STARTUP_MODE: StartupMode = os.environ.get("STARTUP_MODE", "eager")
 
 
-# protect the api by verifying the Authorizer header with Firebase
-cred = credentials.ApplicationDefault()
-firebase_admin.initialize_app(cred)
+def build_extractor() -> ResumeExtractor:
+    """The extraction chain and its HTTP client, routed across several models when MODEL_BACKENDS is set"""
+    # the router is only imported when the extractor is built, it pulls in langchain
+    from .model_router import ModelRouter
 
-security = HTTPBearer()
+    return ResumeExtractor(router=ModelRouter.from_env())
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(security)):
-    token = credentials.credentials
+
+async def warm_auth() -> None:
+    if os.environ.get("AUTH_WARMUP", "true").lower() != "true":
+        return
     try:
-        # Verify the Firebase token
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token
+        await run_in_threadpool(auth.token_verifier.warm)
     except Exception as e:
-        print(e)
-        raise HTTPException(status_code=403, detail=f"Invalid authentication credentials: {str(e)}")
-    
+        # the first request fetches the keys again
+        print(f"auth warmup failed: {e!r}")
+
+
+async def warm_up(app: FastAPI) -> ResumeExtractor:
+    """Everything the first parse needs: the extraction chains, the LLM connection and the token signing keys"""
+    started = time.perf_counter()
+    # building the chains imports langchain, in a worker thread so /healthz and /readyz answer meanwhile
+    extractor, _ = await asyncio.gather(run_in_threadpool(build_extractor), warm_auth())
+    app.state.extractor = extractor
+    if os.environ.get("OPENAI_WARMUP_CONNECTION", "true").lower() == "true":
+        await extractor.awarmup()
+    app.state.warmup_seconds = round(time.perf_counter() - started, 3)
+    print(f"warmup ({STARTUP_MODE}): {app.state.warmup_seconds:.2f}s")
+    return extractor
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup = warm_extractor(lambda: warm_up(app))
+    app.state.warmup = warmup
+    if STARTUP_MODE != "lazy":
+        await warmup
+    # background workers for the /jobs API, jobs queued before a restart are picked up again
+    jobs = JobQueue(run_job)
+    await jobs.start()
+    app.state.jobs = jobs
+    yield
+    await jobs.stop()
+    # a lazy warmup may still be running, or have failed
+    await asyncio.wait([warmup])
+    set_extractor(None)
+    extractor = getattr(app.state, "extractor", None)
+    if extractor is not None:
+        await extractor.aclose()
+    shutdown_process_pool()
+
 app = FastAPI(
     title="LangChain Server",
     version="1.0",
     description="Spin up a simple api server using Langchain's Runnable interfaces",
-    dependencies=[Depends(get_current_user)]
+    dependencies=[Depends(get_current_user)],
+    lifespan=lifespan,
 )
+app.add_middleware(MetricsMiddleware, log_requests=os.environ.get("LOG_REQUESTS", "true").lower() == "true")
+
+@app.exception_handler(ConcurrencyLimitExceeded)
+async def concurrency_limit_handler(request: Request, exc: ConcurrencyLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(BackendUnavailable)
+async def backend_unavailable_handler(request: Request, exc: BackendUnavailable):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(ExtractionError)
+async def extraction_error_handler(request: Request, exc: ExtractionError):
+    return JSONResponse(status_code=502, content={"detail": str(exc), "section": exc.section})
+
+
+@app.exception_handler(IngestError)
+async def ingest_error_handler(request: Request, exc: IngestError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
+def log_preprocess(result: PreprocessResult) -> PreprocessResult:
+    print(f"trace={trace_id_var.get()} preprocess: {result.tokens_before} -> {result.tokens_after} tokens "
+          f"({result.tokens_saved} saved, truncated={result.truncated})")
+    return result
+
+
+async def pdf_to_resume_text(path: str) -> PreprocessResult:
+    with stage("pdf_extract"):
+        pages = await extract_pdf_pages(path)
+    with stage("preprocess"):
+        result = await run_in_threadpool(preprocess_pages, pages)
+    return log_preprocess(result)
+
+
+async def clean_resume_text(text: str) -> PreprocessResult:
+    with stage("preprocess"):
+        result = await run_in_threadpool(preprocess_text, text)
+    return log_preprocess(result)
+
+
+async def run_job(job: Job) -> Tuple[dict, Dict[str, str]]:
+    """Parse a queued job the same way /upload_pdf and /parse_resume_text do"""
+    if job.kind == "pdf":
+        path = await run_in_threadpool(spool_to_file, io.BytesIO(job.payload), len(job.payload))
+        try:
+            cleaned = await pdf_to_resume_text(path)
+        finally:
+            os.unlink(path)
+    else:
+        cleaned = await clean_resume_text(job.payload.decode("utf-8"))
+    return await aresume_to_json(cleaned.text, job.mode), cleaned.headers()
+
+
+async def parse_cleaned(cleaned: PreprocessResult, mode: ParseMode, user: dict, response: Response) -> dict:
+    if mode != "incremental":
+        return await aresume_to_json(cleaned.text, mode)
+    output, reused, extracted = await aresume_revision_to_json(user["uid"], cleaned.text)
+    response.headers["X-Reused-Sections"] = ",".join(reused)
+    response.headers["X-Extracted-Sections"] = ",".join(extracted)
+    return output
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.jobs
+
+
+async def read_resume_text(request: Request, text: Optional[str] = None) -> str:
+    """Resume text from the ``text`` query param, or from a JSON body ``{"text": ...}`` that may be gzip compressed"""
+    if text is not None:
+        return text
+    body = await request.body()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_TEXT_BODY_BYTES)
+        except zlib.error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+        if decompressor.unconsumed_tail:
+            raise HTTPException(status_code=413, detail="The decompressed body is too large")
+    if len(body) > MAX_TEXT_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="The body is too large")
+    try:
+        text = json.loads(body)["text"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=422, detail='Send the resume as the "text" query param or a JSON body {"text": ...}')
+    if not isinstance(text, str):
+        raise HTTPException(status_code=422, detail='"text" must be a string')
+    return text
 
-# all routes require authentication
+
+async def metrics(request: Request) -> Response:
+    """Prometheus metrics, see app.metrics"""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return Response(status_code=401)
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def healthz(request: Request) -> Response:
+    """Liveness probe, answers as soon as the server accepts connections"""
+    return JSONResponse({"status": "ok"})
+
+
+async def readyz(request: Request) -> Response:
+    """Readiness probe, 503 until the startup warmup is done (only ever seen with STARTUP_MODE=lazy)"""
+    warmup = getattr(request.app.state, "warmup", None)
+    if warmup is None or not warmup.done():
+        return JSONResponse({"status": "starting", "startup_mode": STARTUP_MODE}, status_code=503)
+    if warmup.exception() is not None:
+        return JSONResponse({"status": "failed", "detail": repr(warmup.exception())}, status_code=503)
+    return JSONResponse({
+        "status": "ready",
+        "startup_mode": STARTUP_MODE,
+        "warmup_seconds": getattr(request.app.state, "warmup_seconds", None),
+    })
+
+# plain Starlette routes, so they are scraped and probed without the app's Firebase dependency
+app.add_route("/metrics", metrics, include_in_schema=False)
+app.add_route("/healthz", healthz, include_in_schema=False)
+app.add_route("/readyz", readyz, include_in_schema=False)
+
+
+# all other routes require authentication
 @app.get("/authtest")
 async def test():
     return "Authentication check successful!"
 
 @app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    content = await file.read()
-    pdf = pymupdf.open(stream=content, filetype="pdf")
-    text = ""
-    for page in pdf:
-        text += page.get_text()
-    pdf.close()
-    json_output = resume_to_json(text)
+async def upload_pdf(response: Response, file: UploadFile = File(...), mode: ParseMode = "single",
+                     user: dict = Depends(get_current_user)):
+    async with spooled_upload(file) as path:
+        cleaned = await pdf_to_resume_text(path)
+    response.headers.update(cleaned.headers())
+    json_output = await parse_cleaned(cleaned, mode, user, response)
     return json_output
 
 @app.post("/parse_resume_text")
-async def parse_resume_text(text: str):
-    json_output = resume_to_json(text)
+async def parse_resume_text(response: Response, text: str = Depends(read_resume_text), mode: ParseMode = "single",
+                            user: dict = Depends(get_current_user)):
+    cleaned = await clean_resume_text(text)
+    response.headers.update(cleaned.headers())
+    json_output = await parse_cleaned(cleaned, mode, user, response)
     return json_output
 
-# add_routes(
-#     app,
-#     ChatOpenAI(model="gpt-3.5-turbo-0125"),
-#     path="/openai",
-# )
-
-# add_routes(
-#     app,
-#     Ollama(model="mistral"),
-#     path="/mistral"
-# )
+def stream_events(cleaned: PreprocessResult) -> StreamingResponse:
+    async def events():
+        try:
+            async for event in astream_resume(cleaned.text):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(e)
+            yield json.dumps({"event": "error", "type": type(e).__name__, "detail": str(e)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers=cleaned.headers())
+
+@app.post("/upload_pdf/stream")
+async def upload_pdf_stream(file: UploadFile = File(...)):
+    """Like /upload_pdf but streams NDJSON events, each Resume field as soon as the model completes it"""
+    async with spooled_upload(file) as path:
+        cleaned = await pdf_to_resume_text(path)
+    return stream_events(cleaned)
+
+@app.post("/parse_resume_text/stream")
+async def parse_resume_text_stream(text: str = Depends(read_resume_text)):
+    """Like /parse_resume_text but streams NDJSON events, each Resume field as soon as the model completes it"""
+    return stream_events(await clean_resume_text(text))
+
+@app.post("/batch_parse")
+async def batch_parse(
+    files: List[UploadFile] = File(default=[]),
+    texts: List[str] = Form(default=[]),
+    max_concurrency: int = 4,
+    mode: ExtractionMode = "single",
+):
+    """Parse many resumes at once, streaming one NDJSON line per resume as it finishes.
+
+    Lines carry the item ``index`` (files first, then texts, in request order) and either
+    ``resume`` or ``error``, a failing item does not fail the batch.
+    """
+    if not files and not texts:
+        raise HTTPException(status_code=422, detail="Provide at least one file or text")
+    if len(files) + len(texts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch holds at most {BATCH_MAX_ITEMS} resumes")
+
+    # uploads are closed once this handler returns, spool them to temp files that live until the stream ends
+    spooled = AsyncExitStack()
+    try:
+        items = [(file.filename, await spooled.enter_async_context(spooled_upload(file)), None) for file in files]
+    except BaseException:
+        await spooled.aclose()
+        raise
+    items += [(f"texts[{i}]", None, text) for i, text in enumerate(texts)]
+
+    def make_job(path, text):
+        async def job():
+            # like /jobs workers, a batch item waits for its LLM slots instead of being rejected: the batch
+            # already streams its results as they come, and with mode=sections each item takes several slots
+            background_var.set(True)
+            cleaned = await (clean_resume_text(text) if path is None else pdf_to_resume_text(path))
+            return await aresume_to_json(cleaned.text, mode)
+        return job
+
+    jobs = [make_job(path, text) for _, path, text in items]
+    limit = min(max(1, max_concurrency), BATCH_MAX_CONCURRENCY)
+
+    async def results():
+        try:
+            async for index, result in bounded_as_completed(jobs, limit):
+                line = {"index": index, "source": items[index][0]}
+                if isinstance(result, Exception):
+                    line["error"] = {"type": type(result).__name__, "detail": str(result)}
+                else:
+                    line["resume"] = result
+                yield json.dumps(line) + "\n"
+        finally:
+            await spooled.aclose()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    response: Response,
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    mode: ExtractionMode = "single",
+    user: dict = Depends(get_current_user),
+    jobs: JobQueue = Depends(get_job_queue),
+):
+    """Queue a resume (a PDF ``file`` or ``text``) for parsing and return its job id at once.
+
+    Submitting the same resume again returns the existing job instead of parsing it twice.
+    """
+    if (file is None) == (text is None):
+        raise HTTPException(status_code=422, detail="Provide either a file or text")
+    if file is not None:
+        async with spooled_upload(file) as path:
+            # reject files that are not PDFs now rather than as a failed job
+            await run_in_threadpool(count_pages, path, ingest_settings.max_pages)
+            payload = await run_in_threadpool(Path(path).read_bytes)
+    else:
+        payload = text.encode("utf-8")
+        if len(payload) > MAX_TEXT_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="The text is too large")
+
+    job_id, deduplicated = await jobs.asubmit(user["uid"], "text" if file is None else "pdf", payload, mode)
+    job = await jobs.aget(job_id, user["uid"])
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return {"job_id": job_id, "status": job["status"], "deduplicated": deduplicated}
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    response: Response,
+    wait: float = 0,
+    user: dict = Depends(get_current_user),
+    jobs: JobQueue = Depends(get_job_queue),
+):
+    """The job's status, and its ``result`` or ``error`` once finished.
+
+    With ``wait`` (seconds) the request is held until the job finishes or the time runs out.
+    """
+    job = await jobs.aget(job_id, user["uid"], wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such job")
+    headers = job.pop("headers")
+    if job["status"] == "done":
+        response.headers.update(headers)
+    elif job["status"] != "failed":
+        response.headers["Retry-After"] = "1"
+    return job
+
+@app.get("/job_stats")
+async def job_stats(jobs: JobQueue = Depends(get_job_queue)):
+    return await run_in_threadpool(jobs.stats)
+
+@app.get("/cache_stats")
+async def cache_stats():
+    extractor = await aget_extractor()
+    return extractor.cache.stats.as_dict()
+
+@app.get("/auth_stats")
+async def auth_stats():
+    return auth.token_verifier.stats()
+
+@app.get("/llm_stats")
+async def llm_stats():
+    extractor = await aget_extractor()
+    stats = extractor.limiter.stats()
+    if extractor.router is not None:
+        stats["backends"] = extractor.router.stats()
+    return stats
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+from typing import Any, Dict, List
+
+
+class FieldEmitter:
+    """Turns the growing partial ``Resume`` dicts of a streamed function call into field events.
+
+    A top-level field is only complete once the model has started writing the next one, and a list
+    item once the next item (or field) has started, so every event carries final data:
+
+    - ``{"event": "field", "field": name, "value": value}`` for scalar fields
+    - ``{"event": "item", "field": name, "index": i, "value": item}`` for each item of a list field
+    - ``{"event": "done", "resume": resume}`` once the whole resume is parsed
+    """
+
+    def __init__(self):
+        self._emitted_fields = set()
+        self._emitted_items: Dict[str, int] = {}
+
+    def feed(self, partial: Any) -> List[dict]:
+        if not isinstance(partial, dict):
+            return []
+        keys = list(partial)
+        events = []
+        for position, field in enumerate(keys):
+            complete = position < len(keys) - 1
+            events.extend(self._emit(field, partial[field], complete))
+        return events
+
+    def finish(self, resume: dict) -> List[dict]:
+        events = []
+        for field, value in resume.items():
+            events.extend(self._emit(field, value, complete=True))
+        events.append({"event": "done", "resume": resume})
+        return events
+
+    def _emit(self, field: str, value: Any, complete: bool) -> List[dict]:
+        if field in self._emitted_fields:
+            return []
+        if isinstance(value, list):
+            events = []
+            sent = self._emitted_items.get(field, 0)
+            # the last item may still be streaming unless the field itself is complete
+            ready = len(value) if complete else len(value) - 1
+            for index in range(sent, ready):
+                events.append({"event": "item", "field": field, "index": index, "value": value[index]})
+            self._emitted_items[field] = max(sent, ready)
+            if complete:
+                self._emitted_fields.add(field)
+            return events
+        if not complete:
+            return []
+        self._emitted_fields.add(field)
+        return [{"event": "field", "field": field, "value": value}]
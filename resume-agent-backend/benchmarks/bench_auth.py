@@ -0,0 +1,65 @@
+"""Per-request auth overhead with and without the verified-token cache.
+
+Tokens are signed by a locally generated RSA key pair, so nothing talks to Firebase.
+
+    poetry run python -m benchmarks.bench_auth --requests 2000
+"""
+import argparse
+import statistics
+import time
+
+from app.auth import InvalidTokenError, StaticKeys, TokenVerifier
+from benchmarks.local_auth import PROJECT_ID, make_key_pair, make_token
+
+
+def timed(fn, n):
+    samples = []
+    for _ in range(n):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<26} mean {statistics.mean(samples) * 1e6:9.1f} us   p95 {p95 * 1e6:9.1f} us")
+
+
+def check(verifier, token, expected_ok):
+    try:
+        verifier.verify(token)
+        ok = True
+    except InvalidTokenError:
+        ok = False
+    assert ok == expected_ok, token
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    signer, public_pem = make_key_pair("key-1")
+    keys = StaticKeys({"key-1": public_pem})
+    token = make_token(signer)
+
+    # sanity check the verifier against good and bad tokens before timing it
+    strict = TokenVerifier(PROJECT_ID, keys=keys, max_entries=0)
+    other_signer, _ = make_key_pair("key-1")
+    check(strict, token, True)
+    check(strict, make_token(other_signer), False)
+    check(strict, make_token(signer, aud="another-project"), False)
+    check(strict, make_token(signer, lifetime=-3600, iat=int(time.time()) - 7200), False)
+    check(strict, make_token(signer, sub=""), False)
+
+    uncached = TokenVerifier(PROJECT_ID, keys=keys, max_entries=0)
+    cached = TokenVerifier(PROJECT_ID, keys=keys)
+    report("verify every request", timed(lambda: uncached.verify(token), args.requests))
+    report("verified-token cache", timed(lambda: cached.verify(token), args.requests))
+    print(f"cache stats: {cached.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Per-request overhead of building the extraction chain vs reusing a long-lived ResumeExtractor.
+
+Runs against a local fake OpenAI server so only client-side overhead (schema conversion, chain
+construction, new HTTP client and connection) is measured.
+
+    poetry run python -m benchmarks.bench_extractor --requests 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from langchain_openai import ChatOpenAI
+
+from app.cache import ParseCache
+from app.llm import ExtractorSettings, ResumeExtractor
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+def timed(fn, n):
+    samples = []
+    for i in range(n):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(samples) * 1000:7.2f} ms   p95 {p95 * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer() as server:
+        settings = ExtractorSettings(base_url=server.base_url)
+        # unique text per request and a disabled cache so every call reaches the server
+        no_cache = ParseCache(max_entries=0)
+
+        def per_request(i):
+            ResumeExtractor.build_chain(ChatOpenAI(base_url=server.base_url)).invoke({"input": f"resume {i}"})
+
+        extractor = ResumeExtractor(settings, cache=no_cache)
+
+        def reused(i):
+            extractor.extract(f"resume {i}")
+
+        def build_only(i):
+            ResumeExtractor.build_chain(ChatOpenAI(base_url=server.base_url))
+
+        report("chain build only", timed(build_only, args.requests))
+
+        before = server.connections
+        report("build per request", timed(per_request, args.requests))
+        print(f"{'':<28} {server.connections - before} connections opened")
+
+        before = server.connections
+        report("long-lived extractor", timed(reused, args.requests))
+        print(f"{'':<28} {server.connections - before} connections opened")
+
+
+if __name__ == "__main__":
+    main()
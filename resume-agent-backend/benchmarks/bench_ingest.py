@@ -0,0 +1,75 @@
+"""PDF ingestion: in-memory read with string concatenation vs spooled upload and page-parallel extraction.
+
+    poetry run python -m benchmarks.bench_ingest --pages 1 10 50 100 200
+"""
+import argparse
+import asyncio
+import io
+import os
+import time
+import tracemalloc
+
+import pymupdf
+
+from app import ingest
+from benchmarks.synthetic import synthetic_pdf
+
+
+def baseline(content: bytes) -> str:
+    # what upload_pdf used to do
+    data = io.BytesIO(content).read()
+    pdf = pymupdf.open(stream=data, filetype="pdf")
+    text = ""
+    for page in pdf:
+        text += page.get_text()
+    pdf.close()
+    return text
+
+
+def spooled(content: bytes) -> str:
+    path = ingest.spool_to_file(io.BytesIO(content), ingest.settings.max_upload_bytes)
+    try:
+        return "".join(asyncio.run(ingest.extract_pdf_pages(path)))
+    finally:
+        os.unlink(path)
+
+
+def measure(fn, content, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        fn(content)
+        best = min(best, time.perf_counter() - started)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=ingest.settings.workers)
+    args = parser.parse_args()
+
+    ingest.settings.workers = args.workers
+    ingest.settings.max_pages = max(args.pages)
+    ingest.settings.max_upload_bytes = 1 << 30
+    # start the worker processes before timing anything
+    if args.workers > 1:
+        for future in [ingest.get_process_pool().submit(int) for _ in range(args.workers)]:
+            future.result()
+
+    print(f"{'pages':>5} {'size':>8} {'baseline':>10} {'ingest':>10} {'py peak base':>13} {'py peak ingest':>15}")
+    for pages in args.pages:
+        content = synthetic_pdf(pages)
+        base_time, base_peak = measure(baseline, content, args.repeat)
+        new_time, new_peak = measure(spooled, content, args.repeat)
+        print(f"{pages:>5} {len(content) / 1024:>6.0f}KB {base_time * 1000:>8.1f}ms {new_time * 1000:>8.1f}ms "
+              f"{base_peak / 1024:>11.0f}KB {new_peak / 1024:>13.0f}KB")
+    ingest.shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
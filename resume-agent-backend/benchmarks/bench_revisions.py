@@ -0,0 +1,78 @@
+"""LLM tokens and latency of re-parsing a revised resume: full extraction vs incremental.
+
+Parses a synthetic resume once, then revisions that change one bullet, one whole job, the skills
+line, or nothing, and reports the prompt + completion tokens and wall-clock time of each.
+
+    poetry run python -m benchmarks.bench_revisions --pages 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app import llm, revisions
+from app.cache import ParseCache
+from app.concurrency import LLMLimiter
+from app.llm import ExtractorSettings, ResumeExtractor
+from app.metrics import LLM_TOKENS
+from benchmarks.fake_llm import FakeResumeChatModel
+from benchmarks.synthetic import synthetic_resume_pages
+
+MODEL = "fake-resume"
+
+
+def tokens() -> float:
+    return LLM_TOKENS.value(model=MODEL, kind="prompt") + LLM_TOKENS.value(model=MODEL, kind="completion")
+
+
+def revise(text: str):
+    lines = text.splitlines()
+    bullet = next(i for i, line in enumerate(lines) if line.startswith("- "))
+    one_bullet = lines[:bullet] + ["- Rewrote the search service, cutting p95 latency by 40%"] + lines[bullet + 1:]
+    job_end = next(i for i in range(bullet, len(lines)) if not lines[i].startswith("- "))
+    whole_job = lines[:bullet - 1] + ["Staff Engineer, Company 0 | Jun 2024 - Present",
+                                      "- Led the platform team", "- Cut cloud costs by 30%"] + lines[job_end:]
+    skills = next(i for i, line in enumerate(lines) if line == "SKILLS") + 1
+    new_skill = lines[:skills] + [lines[skills] + ", Elixir (3)"] + lines[skills + 1:]
+    return {
+        "unchanged": text,
+        "one bullet": "\n".join(one_bullet),
+        "one job": "\n".join(whole_job),
+        "skills": "\n".join(new_skill),
+    }
+
+
+async def measure(parse):
+    before, started = tokens(), time.perf_counter()
+    result = await parse()
+    return tokens() - before, time.perf_counter() - started, result
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--time-to-first-token", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.005)
+    args = parser.parse_args()
+
+    revisions._store = revisions.RevisionStore(path=os.path.join(tempfile.mkdtemp(), "revisions.sqlite3"))
+    model = FakeResumeChatModel(time_to_first_token=args.time_to_first_token, seconds_per_token=args.seconds_per_token)
+    llm.set_extractor(ResumeExtractor(ExtractorSettings(model=MODEL), cache=ParseCache(max_entries=0),
+                                      limiter=LLMLimiter(max_concurrency=64), model=model))
+
+    text = synthetic_resume_pages(args.pages)
+    spent, elapsed, _ = await measure(lambda: llm.aresume_revision_to_json("bench-user", text))
+    print(f"{'first upload':<12} {spent:>8.0f} tokens {elapsed:>6.2f}s")
+
+    print(f"{'revision':<12} {'full':>15} {'incremental':>23}  extracted")
+    for label, revised in revise(text).items():
+        full_tokens, full_seconds, _ = await measure(lambda: llm.aresume_to_json(revised, "sections"))
+        spent, elapsed, (_, _, extracted) = await measure(lambda: llm.aresume_revision_to_json("bench-user", revised))
+        # every revision is compared against the original again
+        await llm.aresume_revision_to_json("bench-user", text)
+        print(f"{label:<12} {full_tokens:>7.0f} {full_seconds:>6.2f}s {spent:>14.0f} {elapsed:>6.2f}s  {','.join(extracted) or '-'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Tail latency and failover of the model router, with fake backends.
+
+"primary" is fast but ``--slow-probability`` of its calls take ``--slow-seconds`` longer, "secondary"
+is slower but steady. Compares sending everything to the primary, routing without hedging and
+routing with hedging, then makes the primary fail to show the circuit breaker failing over.
+
+    poetry run python -m benchmarks.bench_router --requests 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.cache import ParseCache
+from app.concurrency import LLMLimiter
+from app.llm import ExtractorSettings, ResumeExtractor
+from app.model_router import Backend, CircuitBreaker, ModelRouter
+from benchmarks.fake_llm import FakeResumeChatModel
+from benchmarks.synthetic import synthetic_resume
+
+
+def backends(args):
+    primary = FakeResumeChatModel(time_to_first_token=0.1, seconds_per_token=0.0005,
+                                  slow_probability=args.slow_probability, slow_seconds=args.slow_seconds)
+    secondary = FakeResumeChatModel(time_to_first_token=0.3, seconds_per_token=0.0005)
+    return [
+        Backend("primary", primary, expected_latency=0.5, breaker=CircuitBreaker(3, cooldown=5)),
+        Backend("secondary", secondary, expected_latency=0.8),
+    ]
+
+
+def extractor(model=None, router=None):
+    return ResumeExtractor(ExtractorSettings(model="fake"), cache=ParseCache(max_entries=0),
+                           limiter=LLMLimiter(max_concurrency=64, max_queue=-1), model=model, router=router)
+
+
+async def run(label, parse, requests, concurrency):
+    latencies, errors = [], 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                await parse(synthetic_resume(seed=i))
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    print(f"{label:<24} p50 {cuts[49]:6.2f}s  p95 {cuts[94]:6.2f}s  p99 {cuts[98]:6.2f}s  errors {errors}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--slow-probability", type=float, default=0.05)
+    parser.add_argument("--slow-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    primary_only = extractor(model=backends(args)[0].model)
+    await run("primary only", primary_only.aextract, args.requests, args.concurrency)
+
+    router = ModelRouter(backends(args), hedge=False)
+    await run("router, no hedging", extractor(router=router).aextract, args.requests, args.concurrency)
+
+    router = ModelRouter(backends(args), hedge=True)
+    await run("router, hedging at p95", extractor(router=router).aextract, args.requests, args.concurrency)
+    calls = sum(backend.calls for backend in router.backends)
+    print(f"{'':<24} {calls} LLM calls for {args.requests} parses ({calls / args.requests - 1:.1%} extra)")
+
+    # the primary goes down: after 3 failures its breaker opens and calls go straight to the secondary
+    router.backends[0].model.error_probability = 1.0
+    await run("primary failing", extractor(router=router).aextract, args.requests, args.concurrency)
+    for stats in router.stats():
+        print(f"{'':<24} {stats['name']:<10} {stats['state']:<9} calls {stats['calls']:>4}  "
+              f"failures {stats['failures']:>3}  hedges {stats['hedges']:>3}  wins {stats['wins']:>4}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""Wall-clock latency of "single" vs "sections" extraction on multi-page resumes.
+
+Uses the fake chat model, whose latency grows with the size of its answer like a real model's.
+
+    poetry run python -m benchmarks.bench_sections --pages 1 2 4 8
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.cache import ParseCache
+from app.concurrency import LLMLimiter
+from app.llm import ExtractorSettings, ResumeExtractor
+from benchmarks.fake_llm import FakeResumeChatModel
+from benchmarks.synthetic import synthetic_resume_pages
+
+
+async def measure(extractor, text, mode, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = await extractor.aextract(text, mode)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), output
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--time-to-first-token", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.01)
+    args = parser.parse_args()
+
+    model = FakeResumeChatModel(time_to_first_token=args.time_to_first_token, seconds_per_token=args.seconds_per_token)
+    extractor = ResumeExtractor(
+        ExtractorSettings(model="fake"),
+        cache=ParseCache(max_entries=0),
+        limiter=LLMLimiter(max_concurrency=64),
+        model=model,
+    )
+
+    print(f"{'pages':>5} {'single':>10} {'sections':>10} {'speedup':>8}  same jobs")
+    for pages in args.pages:
+        text = synthetic_resume_pages(pages)
+        single, single_output = await measure(extractor, text, "single", args.repeat)
+        sections, sections_output = await measure(extractor, text, "sections", args.repeat)
+        same = single_output["work_experiences"] == sections_output["work_experiences"]
+        print(f"{pages:>5} {single:>9.2f}s {sections:>9.2f}s {single / sections:>7.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""Cold start of the backend: import time of app.server and time to the first request, per STARTUP_MODE.
+
+Import time is measured in fresh interpreters (median of ``--runs``), with the modules that take the
+longest to import. Time to first request starts benchmarks.fake_server (fake LLM, local auth) and
+reports, from process start, when /healthz first answers, when /readyz turns 200 and when the first
+/parse_resume_text sent right after /healthz answers returns. Results are written as JSON, and
+--compare checks them against an earlier run.
+
+    poetry run python -m benchmarks.bench_startup --output startup.json
+    poetry run python -m benchmarks.bench_startup --compare startup.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.load_test import free_port
+from benchmarks.local_auth import make_key_pair, make_token
+from benchmarks.synthetic import synthetic_resume
+
+MODES = ("eager", "lazy")
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import app.server; print(time.perf_counter() - started)"
+ENV = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark")}
+
+
+def import_seconds() -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=ENV, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(top: int) -> list:
+    """The top-level modules (first imported by app.*) with the largest cumulative import time"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.server"],
+                            env=ENV, capture_output=True, text=True, check=True)
+    modules, parent_depth = [], None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if name.startswith("app"):
+            parent_depth = depth
+        # direct dependencies of the app's own modules, their imports are nested one level deeper
+        elif parent_depth is not None and depth == parent_depth + 1:
+            modules.append((name, int(cumulative) / 1e6))
+    modules.sort(key=lambda module: module[1], reverse=True)
+    return [{"module": name, "seconds": round(seconds, 3)} for name, seconds in modules[:top]]
+
+
+def first_request(mode: str, public_key_path: str, token: str, timeout: float = 60.0) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    times = {}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_server", "--public-key", public_key_path, "--port", str(port),
+         "--time-to-first-token", "0", "--seconds-per-token", "0"],
+        env={**ENV, "STARTUP_MODE": mode, "PARSE_CACHE_SIZE": "0"},
+        stdout=subprocess.DEVNULL,
+    )
+
+    def poll(name: str, path: str) -> None:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            try:
+                if httpx.get(base_url + path, timeout=timeout).status_code == 200:
+                    times[name] = time.perf_counter() - started
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+
+    try:
+        poll("listen_s", "/healthz")
+        # /readyz is polled while the first parse is in flight, with lazy startup both wait for the warmup
+        ready = threading.Thread(target=poll, args=("ready_s", "/readyz"))
+        ready.start()
+        response = httpx.post(f"{base_url}/parse_resume_text", json={"text": synthetic_resume(seed=0)},
+                              headers={"Authorization": f"Bearer {token}"}, timeout=timeout)
+        if response.status_code == 200:
+            times["first_request_s"] = time.perf_counter() - started
+        ready.join()
+    finally:
+        process.terminate()
+        process.wait()
+    return {"mode": mode, **{name: round(times[name], 3) if name in times else None
+                             for name in ("listen_s", "ready_s", "first_request_s")}}
+
+
+def compare(report: dict, baseline_path: str, max_regression: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    pairs = [("import", "median_s", report["import"], baseline["import"])]
+    base_modes = {r["mode"]: r for r in baseline["startup"]}
+    for result in report["startup"]:
+        for metric in ("listen_s", "ready_s", "first_request_s"):
+            pairs.append((result["mode"], metric, result, base_modes.get(result["mode"], {})))
+    ok = True
+    print(f"\n{'':<8} {'metric':<16} {'seconds':>18}")
+    for label, metric, result, base in pairs:
+        if not base.get(metric) or result.get(metric) is None:
+            continue
+        change = result[metric] / base[metric] - 1
+        regressed = change > max_regression
+        ok = ok and not regressed
+        print(f"{label:<8} {metric:<16} {result[metric]:>9.3f} ({change:+.0%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--top", type=int, default=8, help="slowest imports to report")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    imports = [import_seconds() for _ in range(args.runs)]
+    report = {"import": {"median_s": round(statistics.median(imports), 3), "min_s": round(min(imports), 3),
+                         "slowest": slowest_imports(args.top)}}
+    print(json.dumps(report["import"]))
+
+    signer, public_pem = make_key_pair()
+    token = make_token(signer)
+    with tempfile.NamedTemporaryFile("w", suffix=".pem", delete=False) as f:
+        f.write(public_pem)
+    report["startup"] = []
+    try:
+        for mode in args.modes:
+            runs = [first_request(mode, f.name, token) for _ in range(args.runs)]
+            # the median of each metric over the runs, None if any run never got there
+            result = {"mode": mode}
+            for metric in ("listen_s", "ready_s", "first_request_s"):
+                values = [run[metric] for run in runs]
+                result[metric] = None if None in values else round(statistics.median(values), 3)
+            report["startup"].append(result)
+            print(json.dumps(result))
+    finally:
+        os.unlink(f.name)
+
+    report["meta"] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare and not compare(report, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
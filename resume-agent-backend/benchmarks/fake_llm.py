@@ -0,0 +1,112 @@
+"""A deterministic fake chat model that answers the extraction function calls.
+
+It reads resumes laid out like benchmarks.synthetic, returns the function call the chain asked for
+(``Resume`` or one of the section models) and sleeps like a real model would: a fixed time to first
+token plus a per output token cost, so latency grows with the length of the answer.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.pydantic_v1 import Field
+
+JOB_RE = re.compile(r"^(?P<job_title>[^,\n]+), (?P<company>[^|\n]+) \| (?P<start_date>.+?) - (?P<end_date>.+)$")
+EDUCATION_RE = re.compile(r"^(?P<degree>BSc|MSc|PhD) (?P<major>[^,\n]+), (?P<institution>[^,\n]+), (?P<graduation_date>\d{4})$")
+SKILL_RE = re.compile(r"([A-Za-z][\w+#.]*) \(([1-5])\)")
+PROJECT_RE = re.compile(r"^(?P<name>Project [^|\n]+?) \| (?P<role>[^|\n]+?) \| (?P<impact>.+)$")
+EMAIL_RE = re.compile(r"[\w.]+@[\w.]+")
+PHONE_RE = re.compile(r"\+\d[\d ]+\d")
+
+HEADER_FIELDS = ("first_name", "last_name", "email", "phone", "resume_title", "resume_summary", "hobbies")
+FUNCTION_FIELDS = {
+    "Resume": HEADER_FIELDS + ("work_experiences", "educations", "skills", "projects"),
+    "ResumeHeader": HEADER_FIELDS,
+    "WorkExperiences": ("work_experiences",),
+    "Educations": ("educations",),
+    "Skills": ("skills",),
+    "Projects": ("projects",),
+}
+
+
+def extract(text: str) -> dict:
+    """What a perfect model would extract from a synthetic resume"""
+    lines = [line.strip() for line in text.splitlines()]
+    data = {
+        "first_name": "Unknown", "last_name": "Unknown", "email": "unknown@example.com", "phone": None,
+        "resume_title": None, "resume_summary": None, "hobbies": None,
+        "work_experiences": [], "educations": [], "skills": [], "projects": [],
+    }
+    if lines and lines[0] and " " in lines[0] and not JOB_RE.match(lines[0]):
+        data["first_name"], data["last_name"] = lines[0].split(" ", 1)
+    for i, line in enumerate(lines):
+        if EMAIL_RE.search(line) and data["email"] == "unknown@example.com":
+            data["email"] = EMAIL_RE.search(line).group()
+            phone = PHONE_RE.search(line)
+            data["phone"] = phone.group() if phone else None
+            data["resume_title"] = lines[i + 1] if i + 1 < len(lines) else None
+        elif line == "SUMMARY" and i + 1 < len(lines):
+            data["resume_summary"] = lines[i + 1]
+        elif line == "INTERESTS" and i + 1 < len(lines):
+            data["hobbies"] = lines[i + 1].split(", ")
+        elif JOB_RE.match(line):
+            job = JOB_RE.match(line).groupdict()
+            data["work_experiences"].append({**job, "location": None, "description": None, "impacts": []})
+        elif line.startswith("- ") and data["work_experiences"]:
+            data["work_experiences"][-1]["impacts"].append(line[2:])
+        elif EDUCATION_RE.match(line):
+            data["educations"].append({**EDUCATION_RE.match(line).groupdict(), "honors": None})
+        elif PROJECT_RE.match(line):
+            data["projects"].append(PROJECT_RE.match(line).groupdict())
+        else:
+            data["skills"] += [{"name": name, "proficiency": int(level)} for name, level in SKILL_RE.findall(line)]
+    return data
+
+
+class FakeResumeChatModel(BaseChatModel):
+    """Answers ``function_call`` requests with data extracted from the prompt.
+
+    ``slow_probability`` of the calls take ``slow_seconds`` longer and ``error_probability`` of them
+    fail, to exercise tail latency and failover.
+    """
+
+    time_to_first_token: float = 0.3
+    seconds_per_token: float = 0.01
+    slow_probability: float = 0.0
+    slow_seconds: float = 0.0
+    error_probability: float = 0.0
+    rng: random.Random = Field(default_factory=lambda: random.Random(0))
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-resume"
+
+    def _respond(self, messages: List[BaseMessage], kwargs: dict):
+        self.calls += 1
+        if self.rng.random() < self.error_probability:
+            raise RuntimeError(f"{self._llm_type} is unavailable")
+        name = (kwargs.get("function_call") or {}).get("name", "Resume")
+        data = extract(messages[-1].content)
+        arguments = json.dumps({field: data[field] for field in FUNCTION_FIELDS[name]})
+        message = AIMessage(content="", additional_kwargs={"function_call": {"name": name, "arguments": arguments}})
+        # roughly 4 characters per token
+        latency = self.time_to_first_token + self.seconds_per_token * len(arguments) / 4
+        if self.rng.random() < self.slow_probability:
+            latency += self.slow_seconds
+        return ChatResult(generations=[ChatGeneration(message=message)]), latency
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, latency = self._respond(messages, kwargs)
+        time.sleep(latency)
+        return result
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, latency = self._respond(messages, kwargs)
+        await asyncio.sleep(latency)
+        return result
@@ -0,0 +1,110 @@
+"""A local stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+It answers every request with a ``Resume`` function call after ``latency`` seconds and speaks
+HTTP/1.1 keep-alive, so connection reuse on the client side can be measured without the network.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_RESUME = {
+    "first_name": "Jane",
+    "last_name": "Doe",
+    "email": "jane.doe@example.com",
+    "phone": "+1 555 0100",
+    "resume_title": "Senior Backend Engineer",
+    "resume_summary": "Backend engineer with 8 years of experience building data platforms and APIs.",
+    "work_experiences": [
+        {
+            "company": "Acme Corp",
+            "location": "Remote",
+            "job_title": "Senior Backend Engineer",
+            "start_date": "Jan 2020",
+            "end_date": "Present",
+            "description": "Owns the ingestion platform.",
+            "impacts": ["Cut ingestion latency by 40%", "Led a team of 4 engineers"],
+        }
+    ],
+    "educations": [
+        {
+            "degree": "BSc",
+            "major": "Computer Science",
+            "institution": "State University",
+            "graduation_date": "2015",
+            "honors": None,
+        }
+    ],
+    "skills": [{"name": "Python", "proficiency": 5}],
+    "projects": [{"name": "Resume Agent", "role": "Author", "impact": "Open source"}],
+    "hobbies": ["Climbing"],
+}
+
+
+def completion_body(name: str, arguments: dict) -> bytes:
+    return json.dumps({
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{
+            "index": 0,
+            "message": {
+                "role": "assistant",
+                "content": None,
+                "function_call": {"name": name, "arguments": json.dumps(arguments)},
+            },
+            "finish_reason": "stop",
+        }],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }).encode()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.connections = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        functions = request.get("functions") or [{"name": "Resume"}]
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        body = completion_body(functions[0]["name"], SAMPLE_RESUME)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
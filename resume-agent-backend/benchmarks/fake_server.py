@@ -0,0 +1,52 @@
+"""The backend app with OpenAI and Firebase replaced by local fakes, for load testing without spending money.
+
+The LLM is benchmarks.fake_llm.FakeResumeChatModel and ID tokens are verified against a local public
+key (see benchmarks.local_auth). Everything else (cache, limiter, preprocessing, ingestion) is real
+and configured through the usual environment variables.
+
+    python -m benchmarks.fake_server --public-key key.pem --port 8001
+"""
+import argparse
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["OPENAI_WARMUP_CONNECTION"] = "false"
+
+import uvicorn
+
+from app import auth, server
+from app.llm import ResumeExtractor
+from benchmarks.local_auth import local_verifier
+
+
+def build_app(public_pem: str, time_to_first_token: float, seconds_per_token: float):
+    auth.token_verifier = local_verifier(public_pem)
+
+    # the lifespan warmup (eager or lazy, see STARTUP_MODE) builds this extractor instead of the OpenAI one,
+    # the fake model is a langchain chat model, imported there like ChatOpenAI is
+    def build_extractor() -> ResumeExtractor:
+        from benchmarks.fake_llm import FakeResumeChatModel
+
+        model = FakeResumeChatModel(time_to_first_token=time_to_first_token, seconds_per_token=seconds_per_token)
+        return ResumeExtractor(model=model)
+
+    server.build_extractor = build_extractor
+    return server.app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--public-key", required=True, help="PEM file of the key that signs the benchmark tokens")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--time-to-first-token", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.002)
+    args = parser.parse_args()
+
+    with open(args.public_key) as f:
+        app = build_app(f.read(), args.time_to_first_token, args.seconds_per_token)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
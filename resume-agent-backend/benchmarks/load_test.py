@@ -0,0 +1,232 @@
+"""Offline load test of /parse_resume_text, /upload_pdf and the frontend render path.
+
+Starts benchmarks.fake_server in a subprocess (fake LLM, local auth, parse cache off unless --cache),
+drives it at each concurrency level and reports requests/sec, p50/p95/p99 latency and the server's
+peak RSS. Results are written as JSON, and --compare checks them against an earlier run.
+
+    poetry run python -m benchmarks.load_test --concurrency 1 4 16 --output results.json
+    poetry run python -m benchmarks.load_test --compare results.json --max-regression 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from benchmarks.local_auth import make_key_pair, make_token
+from benchmarks.synthetic import synthetic_pdf, synthetic_resume_pages
+
+SCENARIOS = ("parse_resume_text", "upload_pdf", "render")
+# distinct documents per scenario, cycled through by the requests
+DOCUMENTS = 16
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def reset_peak_rss(pid: int) -> None:
+    # writing 5 to clear_refs resets VmHWM, so each level reports its own peak
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def summarize(latencies, errors, elapsed, requests) -> dict:
+    ok = sorted(latencies)
+    cuts = statistics.quantiles(ok, n=100, method="inclusive") if len(ok) > 1 else ok * 99
+    return {
+        "requests": requests,
+        "errors": dict(errors),
+        "rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(cuts[49] * 1000, 1) if ok else None,
+        "p95_ms": round(cuts[94] * 1000, 1) if ok else None,
+        "p99_ms": round(cuts[98] * 1000, 1) if ok else None,
+    }
+
+
+async def run_level(base_url, token, send, concurrency, requests) -> dict:
+    latencies, errors = [], Counter()
+    indexes = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=600) as client:
+        async def worker():
+            for i in indexes:
+                started = time.perf_counter()
+                try:
+                    response = await send(client, i)
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                    continue
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[str(response.status_code)] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed, requests)
+
+
+def senders(pages: int):
+    texts = [synthetic_resume_pages(pages, seed=seed) for seed in range(DOCUMENTS)]
+    pdfs = [synthetic_pdf(pages, seed=seed) for seed in range(DOCUMENTS)]
+    return {
+        "parse_resume_text": lambda client, i: client.post("/parse_resume_text", json={"text": texts[i % DOCUMENTS]}),
+        "upload_pdf": lambda client, i: client.post(
+            "/upload_pdf", files={"file": (f"resume-{i}.pdf", pdfs[i % DOCUMENTS], "application/pdf")}
+        ),
+    }
+
+
+def start_server(args, public_key_path, port):
+    env = {
+        **os.environ,
+        "PARSE_CACHE_SIZE": os.environ.get("PARSE_CACHE_SIZE", "512") if args.cache else "0",
+        "LLM_MAX_CONCURRENCY": str(args.llm_max_concurrency),
+        "LLM_MAX_QUEUE": "-1",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_server", "--public-key", public_key_path, "--port", str(port),
+         "--time-to-first-token", str(args.time_to_first_token), "--seconds-per-token", str(args.seconds_per_token)],
+        env=env,
+        # the server logs every request, keep the report readable
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url, token, process, timeout=60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The fake server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/authtest", headers={"Authorization": f"Bearer {token}"}).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("The fake server did not become ready")
+
+
+def run_render(args) -> list:
+    """The render path lives in the frontend project, run its benchmark with the frontend's interpreter"""
+    command = [args.frontend_python, "-m", "benchmarks.bench_render", "--json", "--wkhtmltopdf", args.wkhtmltopdf,
+               "--renders", str(args.requests), "--concurrency", *map(str, args.concurrency)]
+    result = subprocess.run(command, cwd=args.frontend_dir, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"render benchmark skipped: {result.stderr.strip().splitlines()[-1:] or result.returncode}")
+        return []
+    return [json.loads(line) for line in result.stdout.splitlines() if line.startswith("{")]
+
+
+def compare(results, baseline_path, max_regression) -> bool:
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    ok = True
+    print(f"\n{'scenario':<20} {'conc':>4} {'rps':>16} {'p95 ms':>18}")
+    for result in results:
+        base = baseline.get((result["scenario"], result["concurrency"]))
+        if not base or not base["rps"] or not base["p95_ms"] or result["p95_ms"] is None:
+            continue
+        rps_change = result["rps"] / base["rps"] - 1
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1
+        regressed = rps_change < -max_regression or p95_change > max_regression
+        ok = ok and not regressed
+        print(f"{result['scenario']:<20} {result['concurrency']:>4} {result['rps']:>8} ({rps_change:+.0%}) "
+              f"{result['p95_ms']:>9} ({p95_change:+.0%}){'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=64, help="requests per scenario and concurrency level")
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--time-to-first-token", type=float, default=0.3)
+    parser.add_argument("--seconds-per-token", type=float, default=0.002)
+    parser.add_argument("--llm-max-concurrency", type=int, default=64)
+    parser.add_argument("--cache", action="store_true", help="keep the parse cache on")
+    parser.add_argument("--frontend-dir", default=os.path.join(os.path.dirname(__file__), "..", "..", "resume-agent-frontend"))
+    parser.add_argument("--frontend-python", default=sys.executable)
+    parser.add_argument("--wkhtmltopdf", default="/usr/bin/wkhtmltopdf")
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--compare", help="results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args()
+
+    signer, public_pem = make_key_pair()
+    token = make_token(signer)
+    results = []
+
+    http_scenarios = [s for s in args.scenarios if s != "render"]
+    if http_scenarios:
+        with tempfile.NamedTemporaryFile("w", suffix=".pem", delete=False) as f:
+            f.write(public_pem)
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = start_server(args, f.name, port)
+        try:
+            wait_ready(base_url, token, process)
+            send = senders(args.pages)
+            for scenario in http_scenarios:
+                for concurrency in args.concurrency:
+                    reset_peak_rss(process.pid)
+                    result = asyncio.run(run_level(base_url, token, send[scenario], concurrency, args.requests))
+                    result.update(scenario=scenario, concurrency=concurrency, peak_rss_mb=round(peak_rss_mb(process.pid), 1))
+                    results.append(result)
+                    print(json.dumps(result))
+        finally:
+            process.terminate()
+            process.wait()
+            os.unlink(f.name)
+
+    if "render" in args.scenarios:
+        for result in run_render(args):
+            results.append(result)
+            print(json.dumps(result))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Stand-in for Firebase auth: a local RSA key pair that signs ID tokens the TokenVerifier accepts."""
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+
+from app.auth import StaticKeys, TokenVerifier
+
+PROJECT_ID = "resume-agent-bench"
+KEY_ID = "bench-key"
+
+
+def make_key_pair(kid: str = KEY_ID):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return crypt.RSASigner.from_string(private_pem, key_id=kid), public_pem.decode()
+
+
+def make_token(signer, uid: str = "user-1", lifetime: int = 3600, **overrides) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "auth_time": now - 10,
+        "iat": now - 10,
+        "exp": now + lifetime,
+        **overrides,
+    }
+    return google_jwt.encode(signer, payload).decode()
+
+
+def local_verifier(public_pem: str, kid: str = KEY_ID, **kwargs) -> TokenVerifier:
+    return TokenVerifier(PROJECT_ID, keys=StaticKeys({kid: public_pem}), **kwargs)
@@ -0,0 +1,71 @@
+"""Deterministic synthetic resumes for the benchmarks.
+
+The text follows a fixed layout that benchmarks.fake_llm knows how to "extract", so a fake model
+can return the same structured data a real one would without calling an API.
+"""
+import random
+
+FIRST_NAMES = ["Jane", "John", "Maria", "Wei", "Amara", "Lucas", "Priya", "Tomas"]
+LAST_NAMES = ["Doe", "Smith", "Garcia", "Chen", "Okafor", "Silva", "Patel", "Novak"]
+TITLES = ["Software Engineer", "Senior Software Engineer", "Data Scientist", "Engineering Manager", "Site Reliability Engineer"]
+SKILLS = ["Python", "Go", "Rust", "SQL", "Kubernetes", "Terraform", "React", "Spark", "Kafka", "PostgreSQL", "AWS", "GCP"]
+VERBS = ["Reduced", "Improved", "Designed", "Migrated", "Automated", "Scaled", "Led", "Launched"]
+THINGS = ["the billing pipeline", "search latency", "the data warehouse", "CI build times", "the mobile API", "on-call load"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+JOBS_PER_PAGE = 4
+
+
+def synthetic_resume(jobs: int = 4, bullets: int = 4, educations: int = 2, skills: int = 10,
+                     projects: int = 3, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    lines = [
+        f"{first} {last}",
+        f"{first.lower()}.{last.lower()}@example.com | +1 555 {rng.randint(1000, 9999)}",
+        rng.choice(TITLES),
+        "",
+        "SUMMARY",
+        f"{rng.choice(TITLES)} with {jobs * 2} years of experience shipping production systems.",
+        "",
+        "EXPERIENCE",
+    ]
+    year = 2024
+    for i in range(jobs):
+        start = year - 2
+        lines.append(f"{rng.choice(TITLES)}, Company {i + 1} | {rng.choice(MONTHS)} {start} - {rng.choice(MONTHS)} {year}")
+        for _ in range(bullets):
+            lines.append(f"- {rng.choice(VERBS)} {rng.choice(THINGS)} by {rng.randint(10, 90)}% across {rng.randint(2, 40)} teams")
+        year = start
+    lines += ["", "EDUCATION"]
+    for i in range(educations):
+        lines.append(f"{rng.choice(['BSc', 'MSc', 'PhD'])} Computer Science, University {i + 1}, {year - 4 * i}")
+    lines += ["", "SKILLS"]
+    lines.append(", ".join(f"{skill} ({rng.randint(1, 5)})" for skill in rng.sample(SKILLS, min(skills, len(SKILLS)))))
+    lines += ["", "PROJECTS"]
+    for i in range(projects):
+        lines.append(f"Project {i + 1} | Maintainer | {rng.choice(VERBS)} {rng.choice(THINGS)} for {rng.randint(100, 9000)} users")
+    lines += ["", "INTERESTS", "Climbing, Chess"]
+    return "\n".join(lines)
+
+
+def synthetic_resume_pages(pages: int, seed: int = 0) -> str:
+    """A resume roughly ``pages`` pages long"""
+    return synthetic_resume(jobs=JOBS_PER_PAGE * pages, projects=2 * pages, seed=seed)
+
+
+def synthetic_pdf(pages: int, seed: int = 0) -> bytes:
+    """A ``pages`` page PDF of a synthetic resume, with a running header and page numbers like real ones"""
+    import pymupdf
+
+    lines = synthetic_resume_pages(pages, seed).splitlines()
+    per_page = -(-len(lines) // pages)
+    doc = pymupdf.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 40), f"{lines[0]} - Resume", fontsize=8)
+        page.insert_text((50, 70), "\n".join(lines[number * per_page:(number + 1) * per_page]), fontsize=9)
+        page.insert_text((280, 820), f"Page {number + 1} of {pages}", fontsize=8)
+    content = doc.tobytes()
+    doc.close()
+    return content
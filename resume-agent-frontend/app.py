@@ -2,11 +2,85 @@ import streamlit as st
 import auth_functions
 from io import StringIO
 import pymupdf
-import requests
 from streamlit_pdf_viewer import pdf_viewer
-from jinja2 import Environment, FileSystemLoader
-import pdfkit
 import json
+import os
+from session_cache import content_key, memoize
+from render_service import RenderService
+import http_client
+
+## -------------------------------------------------------------------------------------------------
+## Resume pipeline ---------------------------------------------------------------------------------
+## -------------------------------------------------------------------------------------------------
+@st.cache_resource
+def get_renderer():
+    # one render service per server process, shared by every session
+    return RenderService(
+        template_dir='./templates',
+        wkhtmltopdf='/usr/bin/wkhtmltopdf',
+        workers=int(os.environ.get('RENDER_WORKERS', '2')),
+        max_queue=int(os.environ.get('RENDER_MAX_QUEUE', '8')),
+        render_timeout=float(os.environ.get('RENDER_TIMEOUT', '30')),
+    )
+
+def extract_text(content):
+    # pages are separated by form feeds, the backend uses them to drop running headers, footers and page numbers
+    with pymupdf.open(stream=content, filetype="pdf") as pdf:
+        return "\f".join(page.get_text() for page in pdf)
+
+def stream_resume(text, headers):
+    """Yield the parse events of /parse_resume_text/stream as the server sends them"""
+    body, body_headers = http_client.gzip_json({"text": text})
+    with http_client.session.post(
+        st.secrets["SERVER_URL"] + "/parse_resume_text/stream",
+        data=body,
+        headers={**headers, **body_headers},
+        stream=True,
+        timeout=http_client.PARSE_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def parse_resume(text, headers, preview):
+    """Parse the resume through the streaming endpoint, filling in the preview as sections arrive"""
+    partial = {}
+    for event in stream_resume(text, headers):
+        if event["event"] == "field":
+            partial[event["field"]] = event["value"]
+        elif event["event"] == "item":
+            partial.setdefault(event["field"], []).append(event["value"])
+        elif event["event"] == "done":
+            return event["resume"]
+        elif event["event"] == "error":
+            raise RuntimeError(event["detail"])
+        render_preview(preview, partial)
+    raise RuntimeError("The server closed the stream before the resume was parsed")
+
+def render_preview(placeholder, data):
+    """Show whatever part of the resume has been parsed so far"""
+    with placeholder.container():
+        name = " ".join(filter(None, [data.get("first_name"), data.get("last_name")]))
+        if name:
+            st.subheader(name)
+        if data.get("resume_title"):
+            st.markdown(f"**{data['resume_title']}**")
+        contact = " | ".join(filter(None, [data.get("email"), data.get("phone")]))
+        if contact:
+            st.caption(contact)
+        if data.get("resume_summary"):
+            st.write(data["resume_summary"])
+        for job in data.get("work_experiences") or []:
+            st.markdown(f"**{job.get('job_title', '')}**, {job.get('company', '')} ({job.get('start_date', '')} - {job.get('end_date') or 'Present'})")
+            for impact in job.get("impacts") or []:
+                st.markdown(f"- {impact}")
+        for education in data.get("educations") or []:
+            st.markdown(f"**{education.get('degree', '')} {education.get('major', '')}**, {education.get('institution', '')} ({education.get('graduation_date', '')})")
+        if data.get("skills"):
+            st.markdown("**Skills:** " + ", ".join(skill.get("name", "") for skill in data["skills"]))
+        for project in data.get("projects") or []:
+            st.markdown(f"**{project.get('name', '')}** ({project.get('role', '')}) {project.get('impact') or ''}")
 
 ## -------------------------------------------------------------------------------------------------
 ## Not logged in -----------------------------------------------------------------------------------
@@ -63,66 +137,56 @@ else:
 
     # Resume agent
     uploaded_file = st.file_uploader("Upload your resume pdf", type="pdf")
+    renderer = get_renderer()
+    templates = sorted(renderer.templates)
+    template_name = st.selectbox('Template', templates, index=templates.index('template2.html') if 'template2.html' in templates else 0)
     if uploaded_file is not None:
-        content = uploaded_file.read()
+        content = uploaded_file.getvalue()
+        # every stage is memoized per session by content hash, so reruns (switching templates,
+        # downloading) don't extract, call the LLM or render the pdf again
+        file_key = content_key(content)
 
         # display pdf file as text
         pdf_viewer(content)
 
         try: 
             # extract text from pdf
-            pdf = pymupdf.open(stream=content, filetype="pdf")
-            text = ""
-            for page in pdf:
-                text += page.get_text()
+            text = memoize('text', file_key, lambda: extract_text(content))
         except Exception as e:
             st.error(f"Error extracting text from pdf: {e}")
-        finally:
-            pdf.close()
+            st.stop()
 
-        # send request to api to extract json data
+        # send request to api to extract json data, the preview fills in as each section is parsed
         st.header("Your new resume 👇")
+        preview = st.empty()
+        response_json = None
         with st.spinner('Waiting for server response...'):
             try:
+                trace_id = http_client.new_trace_id()
                 headers = {
-                    "Authorization": f"Bearer {st.session_state.id_token}"
+                    "Authorization": f"Bearer {st.session_state.id_token}",
+                    http_client.TRACE_HEADER: trace_id,
                 }
-                
-                # make a post request using query text
-                response = requests.post(
-                    st.secrets["SERVER_URL"]+ "/parse_resume_text",
-                    params={"text": text},
-                    headers=headers
-                )
-                response_json = response.json()
+                response_json = memoize('parse', file_key, lambda: parse_resume(text, headers, preview))
 
                 # # mock up for testing
                 # response_json = json.loads(open('./data/my_resume_parsed.json').read())
                 # st.write(response_json)
             except Exception as e:
-                st.error(f"Error extracting data to json: {e}")
-
-        # create the new resume using template
-        env = Environment(loader=FileSystemLoader('./templates'))
-        template = env.get_template('template2.html')
-        new_resume_html = template.render(data=response_json)
-
-        # convert html to pdf
-        config = pdfkit.configuration(wkhtmltopdf='/usr/bin/wkhtmltopdf')
-        options = {
-            'page-size': 'A4',
-            'margin-top': '0mm',
-            'margin-right': '0mm',
-            'margin-bottom': '0mm',
-            'margin-left': '0mm',
-            'encoding': "UTF-8",
-            'no-outline': None,
-            'no-images': True,
-            'disable-external-links': True,
-            'disable-javascript': True
-        }
-        new_resume_pdf = pdfkit.from_string(new_resume_html, False, options=options, configuration=config)
-        
+                st.error(f"Error extracting data to json: {e} (trace id {trace_id})")
+        preview.empty()
+        if response_json is None:
+            st.stop()
+
+        try:
+            # create the new resume using template
+            new_resume_html = memoize('html', content_key(file_key, template_name), lambda: renderer.render_html(template_name, response_json))
+
+            # convert html to pdf
+            new_resume_pdf = memoize('pdf', content_key(new_resume_html), lambda: renderer.render_pdf(template_name, response_json, new_resume_html))
+        except Exception as e:
+            st.error(f"Error rendering the new resume: {e}")
+            st.stop()
 
         # download button
         st.download_button(
@@ -134,6 +198,3 @@ else:
 
         # display the updated resume
         pdf_viewer(new_resume_pdf)
-
-
-    
@@ -1,6 +1,7 @@
 import json
 import requests
 import streamlit as st
+import http_client
 
 ## -------------------------------------------------------------------------------------------------
 ## Firebase Auth API -------------------------------------------------------------------------------
@@ -10,7 +11,7 @@ def sign_in_with_email_and_password(email, password):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/verifyPassword?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8"}
     data = json.dumps({"email": email, "password": password, "returnSecureToken": True})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     # print('This is the sign in token', request_object.json())
     return request_object.json()
@@ -19,7 +20,7 @@ def get_account_info(id_token):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/getAccountInfo?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8"}
     data = json.dumps({"idToken": id_token})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     return request_object.json()
 
@@ -27,7 +28,7 @@ def send_email_verification(id_token):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/getOobConfirmationCode?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8"}
     data = json.dumps({"requestType": "VERIFY_EMAIL", "idToken": id_token})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     return request_object.json()
 
@@ -35,7 +36,7 @@ def send_password_reset_email(email):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/getOobConfirmationCode?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8"}
     data = json.dumps({"requestType": "PASSWORD_RESET", "email": email})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     return request_object.json()
 
@@ -43,7 +44,7 @@ def create_user_with_email_and_password(email, password):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/signupNewUser?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8" }
     data = json.dumps({"email": email, "password": password, "returnSecureToken": True})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     return request_object.json()
 
@@ -51,7 +52,7 @@ def delete_user_account(id_token):
     request_ref = "https://www.googleapis.com/identitytoolkit/v3/relyingparty/deleteAccount?key={0}".format(st.secrets['FIREBASE_WEB_API_KEY'])
     headers = {"content-type": "application/json; charset=UTF-8"}
     data = json.dumps({"idToken": id_token})
-    request_object = requests.post(request_ref, headers=headers, data=data)
+    request_object = http_client.session.post(request_ref, headers=headers, data=data, timeout=http_client.AUTH_TIMEOUT)
     raise_detailed_error(request_object)
     return request_object.json()
 
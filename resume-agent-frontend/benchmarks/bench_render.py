@@ -0,0 +1,106 @@
+"""Render throughput and latency: a new Environment plus pdfkit per render vs the RenderService.
+
+Needs wkhtmltopdf. Each render gets distinct data so the service's output cache is not hit, except
+in the "cached" run which re-renders the same resumes.
+
+    python -m benchmarks.bench_render --renders 40 --concurrency 4
+
+With --json only the render service is measured, one JSON line per concurrency level, in the format
+the backend's load test (benchmarks.load_test) collects.
+"""
+import argparse
+import json
+import resource
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pdfkit
+from jinja2 import Environment, FileSystemLoader
+
+from render_service import PDF_OPTIONS, RenderService
+
+TEMPLATE = 'template2.html'
+
+
+def resume(i):
+    return {
+        "first_name": "Jane", "last_name": f"Doe {i}", "email": "jane@example.com", "phone": "+1 555 0100",
+        "resume_title": "Senior Backend Engineer",
+        "resume_summary": "Backend engineer with 8 years of experience building data platforms and APIs.",
+        "work_experiences": json.load(open('parsed.json'))["work_experiences"],
+        "educations": [{"degree": "BSc", "major": "Computer Science", "institution": "State University", "graduation_date": "2015"}],
+        "skills": [{"name": name, "proficiency": 4} for name in ("Python", "Go", "SQL", "Kubernetes")],
+    }
+
+
+def pdfkit_render(wkhtmltopdf):
+    config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf)
+
+    def render(data):
+        # what app.py used to do on every render
+        env = Environment(loader=FileSystemLoader('./templates'))
+        html = env.get_template(TEMPLATE).render(data=data)
+        return pdfkit.from_string(html, False, options=PDF_OPTIONS, configuration=config)
+    return render
+
+
+def run(render, inputs, concurrency):
+    latencies = []
+
+    def timed(data):
+        started = time.perf_counter()
+        render(data)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(timed, inputs))
+    elapsed = time.perf_counter() - started
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(inputs),
+        "errors": {},
+        "rps": round(len(inputs) / elapsed, 2),
+        "p50_ms": round(cuts[49] * 1000, 1),
+        "p95_ms": round(cuts[94] * 1000, 1),
+        "p99_ms": round(cuts[98] * 1000, 1),
+    }
+
+
+def report(label, result):
+    print(f"{label:<22} {result['rps']:8.1f} renders/s   p95 {result['p95_ms']:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--renders", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--wkhtmltopdf", default="/usr/bin/wkhtmltopdf")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    inputs = [resume(i) for i in range(args.renders)]
+    service = RenderService(wkhtmltopdf=args.wkhtmltopdf, workers=args.workers, max_queue=args.renders,
+                            queue_timeout=600, cache_entries=args.renders)
+
+    for concurrency in args.concurrency:
+        if args.json:
+            service._cache.clear()
+            result = run(lambda data: service.render_pdf(TEMPLATE, data), inputs, concurrency)
+            # wkhtmltopdf runs in child processes, ru_maxrss is in KB on Linux
+            peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            result.update(scenario="render", concurrency=concurrency, peak_rss_mb=round(peak_kb / 1024, 1))
+            print(json.dumps(result))
+            continue
+        print(f"concurrency {concurrency}")
+        report("pdfkit per render", run(pdfkit_render(args.wkhtmltopdf), inputs, concurrency))
+        service._cache.clear()
+        report("render service", run(lambda data: service.render_pdf(TEMPLATE, data), inputs, concurrency))
+        report("render service cached", run(lambda data: service.render_pdf(TEMPLATE, data), inputs, concurrency))
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import gzip
+import json
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+## -------------------------------------------------------------------------------------------------
+## Shared HTTP client ------------------------------------------------------------------------------
+## -------------------------------------------------------------------------------------------------
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+AUTH_TIMEOUT = (5, 15)
+PARSE_TIMEOUT = (5, 180)
+
+# the backend tags its logs and stage timings for a request with this id, and echoes it back
+TRACE_HEADER = 'X-Trace-Id'
+
+# 429 and 503 (with Retry-After) mean the server turned the request away without running it; a 502 or 504
+# may come from a proxy or load balancer while the backend still ran the request
+REJECTED_STATUSES = (429, 503)
+
+class SafeRetry(Retry):
+    """Retry that replays non-idempotent requests (POST, PATCH) only on REJECTED_STATUSES.
+
+    Replaying them on a 502/504 could pay for a parse twice or repeat a Firebase signup,
+    account deletion or verification email.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() not in self.DEFAULT_ALLOWED_METHODS and status_code not in REJECTED_STATUSES:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+class PooledSession(requests.Session):
+    """A requests session with keep-alive connection pools, retries with backoff and a default timeout"""
+
+    def __init__(self, retries=3, backoff_factor=0.5, pool_maxsize=20):
+        super().__init__()
+        # only retry when the request never reached the server or the server asked us to (429/503, and 502/504
+        # for idempotent methods), a POST that timed out while reading may still be running and would be paid
+        # for twice
+        retry = SafeRetry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=pool_maxsize)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+# one session per process, shared by every Streamlit session and rerun
+session = PooledSession()
+
+def gzip_json(payload):
+    """Body and headers for a gzip-compressed JSON request"""
+    body = gzip.compress(json.dumps(payload).encode('utf-8'))
+    headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    return body, headers
+
+def new_trace_id():
+    """A fresh id for TRACE_HEADER, to follow one upload through the backend logs"""
+    return uuid.uuid4().hex
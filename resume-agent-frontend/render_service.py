@@ -0,0 +1,130 @@
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from session_cache import content_key
+
+## -------------------------------------------------------------------------------------------------
+## Resume rendering service ------------------------------------------------------------------------
+## -------------------------------------------------------------------------------------------------
+
+PDF_OPTIONS = {
+    'page-size': 'A4',
+    'margin-top': '0mm',
+    'margin-right': '0mm',
+    'margin-bottom': '0mm',
+    'margin-left': '0mm',
+    'encoding': "UTF-8",
+    'no-outline': None,
+    'no-images': True,
+    'disable-external-links': True,
+    'disable-javascript': True
+}
+
+class RenderError(Exception):
+    pass
+
+class RenderBusy(RenderError):
+    """Raised when the render queue is full"""
+
+def wkhtmltopdf_args(options: dict) -> list:
+    """Command line flags for options in the pdfkit format, where None or True means a bare flag"""
+    args = []
+    for key, value in options.items():
+        if value is False:
+            continue
+        args.append(f'--{key}')
+        if value is not None and value is not True:
+            args.append(str(value))
+    return args
+
+class RenderService:
+    """Renders resumes to HTML with precompiled Jinja templates and to PDF with a pool of workers.
+
+    Templates are compiled once at startup (and their bytecode cached on disk across restarts).
+    PDF renders run on ``workers`` long-lived threads, each driving wkhtmltopdf over stdin/stdout with
+    a ``render_timeout``. At most ``max_queue`` renders wait for a worker, further ones fail fast with
+    RenderBusy. Rendered PDFs are cached by template and data hash, shared by every session.
+    """
+
+    def __init__(self, template_dir: str = './templates', wkhtmltopdf: str = '/usr/bin/wkhtmltopdf',
+                 workers: int = 2, max_queue: int = 8, queue_timeout: float = 10.0,
+                 render_timeout: float = 30.0, cache_entries: int = 64, options: Optional[dict] = None):
+        bytecode_dir = os.environ.get('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'resume-agent-jinja'))
+        os.makedirs(bytecode_dir, exist_ok=True)
+        self.env = Environment(loader=FileSystemLoader(template_dir), bytecode_cache=FileSystemBytecodeCache(bytecode_dir))
+        self.templates = {name: self.env.get_template(name) for name in self.env.list_templates(extensions=['html'])}
+
+        self.command = [wkhtmltopdf, '--quiet'] + wkhtmltopdf_args(options or PDF_OPTIONS) + ['-', '-']
+        self.render_timeout = render_timeout
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pdf-render')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render_html(self, template_name: str, data: dict) -> str:
+        if template_name not in self.templates:
+            raise RenderError(f"Unknown template {template_name}")
+        return self.templates[template_name].render(data=data)
+
+    def render_pdf(self, template_name: str, data: dict, html: Optional[str] = None) -> bytes:
+        key = content_key(template_name, data)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        if html is None:
+            html = self.render_html(template_name, data)
+        pdf = self.html_to_pdf(html)
+
+        with self._cache_lock:
+            self._cache[key] = pdf
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return pdf
+
+    def html_to_pdf(self, html: str) -> bytes:
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise RenderBusy("Too many resumes are being rendered, try again shortly")
+        try:
+            future = self._executor.submit(self._run, html)
+        except BaseException:
+            self._slots.release()
+            raise
+        # the slot is held until the render is done or cancelled, not until we stop waiting for it,
+        # so renders that outlive their caller still count against the queue bound
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            # queue wait is bounded by the slot, the subprocess by render_timeout
+            return future.result(timeout=self.render_timeout + self.queue_timeout)
+        except FutureTimeoutError:
+            # drops the render if no worker has started it yet, a running one ends within render_timeout
+            future.cancel()
+            raise RenderError("Rendering the pdf timed out")
+
+    def _run(self, html: str) -> bytes:
+        try:
+            result = subprocess.run(self.command, input=html.encode('utf-8'), capture_output=True, timeout=self.render_timeout)
+        except subprocess.TimeoutExpired:
+            raise RenderError("Rendering the pdf timed out")
+        # wkhtmltopdf exits with 1 on recoverable network errors but still writes the pdf
+        if not result.stdout:
+            raise RenderError(f"wkhtmltopdf failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
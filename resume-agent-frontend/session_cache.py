@@ -0,0 +1,48 @@
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable
+
+import streamlit as st
+
+## -------------------------------------------------------------------------------------------------
+## Per-session memoization -------------------------------------------------------------------------
+## -------------------------------------------------------------------------------------------------
+
+# entries kept per stage and per session, oldest evicted first
+MAX_ENTRIES = {
+    'text': 8,
+    'parse': 8,
+    'html': 16,
+    'pdf': 8,
+}
+
+def content_key(*parts: Any) -> str:
+    """Hash bytes, strings or JSON-serializable values into a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        elif not isinstance(part, (bytes, bytearray)):
+            part = json.dumps(part, sort_keys=True).encode('utf-8')
+        digest.update(part)
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+def memoize(stage: str, key: str, compute: Callable[[], Any]) -> Any:
+    """Return this session's cached result for ``key`` at ``stage``, computing and storing it on a miss.
+
+    Nothing is stored when ``compute`` raises, so a failed step is retried on the next rerun.
+    Signing out clears the session state and with it every cached entry.
+    """
+    caches = st.session_state.setdefault('memo_cache', {})
+    cache = caches.setdefault(stage, OrderedDict())
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    value = compute()
+    cache[key] = value
+    while len(cache) > MAX_ENTRIES.get(stage, 8):
+        cache.popitem(last=False)
+    return value